@@ -1,24 +1,117 @@
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Body, Response, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from typing import List, Dict, Optional, Any
 import json
 import os
 from datetime import datetime
 import sys
 import uuid
+import time
+import threading
+from contextlib import asynccontextmanager
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.sentiment import analyze_sentiment
-from utils.ai_response import get_ai_response
+from utils.sentiment import SCORER_VERSION
+from utils.ai_response import (
+    get_ai_response_with_source, stream_ai_response_with_source, session_store, answer_cache, llm_client,
+    chat_admission, session_call, SessionOutOfSyncError
+)
+from utils.admission import ClientRateLimiter
+from utils.storage import create_feedback_repository
+from utils.aggregates import SentimentAggregates
+from utils.trending import TrendingIndex, parse_window
+from utils.near_duplicates import NearDuplicateIndex
+from utils.export import (
+    EXPORT_FORMATS, PARQUET_AVAILABLE, export_ndjson, export_csv, export_parquet, gzip_stream
+)
+from utils.executor import SentimentExecutor, ExecutorBusyError
+from utils.write_queue import GroupCommitWriter
+from utils.metrics import registry, span, RequestTimingMiddleware
+from utils.profiler import SamplingProfiler
+from utils.sentiment_cache import SentimentCache
 
-app = FastAPI(title="Citizen AI API", description="Backend API for Citizen AI platform")
+# Ensure data directory exists
+data_dir = os.getenv("CITIZEN_AI_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+os.makedirs(data_dir, exist_ok=True)
+
+# Cache of sentiment results for repeated texts, optionally persisted to disk
+sentiment_cache = SentimentCache(
+    max_entries=int(os.getenv("SENTIMENT_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("SENTIMENT_CACHE_TTL", 24 * 3600)),
+    disk_path=os.path.join(data_dir, "sentiment_cache.db") if os.getenv("SENTIMENT_CACHE_DISK", "true").lower() == "true" else None,
+    max_disk_entries=int(os.getenv("SENTIMENT_CACHE_DISK_SIZE", 200000))
+)
+
+# Sentiment scoring runs off the event loop: inline, thread or process
+sentiment_executor = SentimentExecutor(
+    mode=os.getenv("SENTIMENT_EXECUTOR", "thread").lower(),
+    workers=int(os.getenv("SENTIMENT_WORKERS", 0)) or None,
+    max_pending=int(os.getenv("SENTIMENT_MAX_PENDING", 256)),
+    queue_timeout=float(os.getenv("SENTIMENT_QUEUE_TIMEOUT", 5.0)),
+    cache=sentiment_cache
+)
+
+# Heavy components (sentiment analyzers, Gemini SDK) load on first use and the
+# in-memory feedback indexes are rebuilt from storage; the warm-up does both in
+# the background at startup so / is served at once. /ready reports 503 until
+# they are done.
+readiness = {"feedback_indexes": False, "sentiment": False, "llm": llm_client is None}
+
+def warm_up_components():
+    try:
+        # Writes may land meanwhile; each rebuild counts them exactly once. Not
+        # needed where the feedback endpoints are refused (see API_WORKERS)
+        if API_WORKERS == 1:
+            rebuild_feedback_indexes()
+        readiness["feedback_indexes"] = True
+    except Exception as e:
+        print(f"Error rebuilding feedback indexes: {str(e)}")
+    try:
+        with span("startup.warm_up_sentiment"):
+            sentiment_executor.start()
+        readiness["sentiment"] = True
+    except Exception as e:
+        print(f"Error warming up sentiment analyzers: {str(e)}")
+    if llm_client is not None:
+        try:
+            with span("startup.warm_up_llm"):
+                llm_client.warm_up()
+            readiness["llm"] = True
+        except Exception as e:
+            print(f"Error warming up Gemini client: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    threading.Thread(target=warm_up_components, name="warm-up", daemon=True).start()
+    feedback_writer.start()
+    yield
+    profiler.stop()
+    feedback_writer.shutdown()
+    sentiment_executor.shutdown()
+    if llm_client:
+        llm_client.shutdown()
+
+app = FastAPI(title="Citizen AI API", description="Backend API for Citizen AI platform", lifespan=lifespan)
+
+# Request durations by route, exported on /metrics
+http_request_seconds = registry.histogram(
+    "citizen_ai_http_request_duration_seconds",
+    "HTTP request duration until the last response byte",
+    labelnames=("method", "route", "status")
+)
+app.add_middleware(RequestTimingMiddleware, histogram=http_request_seconds)
 
 # Data Models
 class ChatMessage(BaseModel):
     message: str
     session_id: Optional[str] = None
     context: Optional[List[Dict[str, Any]]] = None
+    # Number of messages the client already holds for this session. When set
+    # without `context`, the server uses its own history for the session.
+    seq: Optional[int] = None
 
 class FeedbackItem(BaseModel):
     text: str
@@ -31,91 +124,552 @@ class SentimentResponse(BaseModel):
     score: float
     timestamp: str
     id: str
+    # Id of the first record of its near-duplicate cluster; equal to id unless this is a near-duplicate
+    cluster_id: Optional[str] = None
 
-# Ensure data directory exists
-data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
-os.makedirs(data_dir, exist_ok=True)
-feedback_file = os.path.join(data_dir, "feedback.json")
+# Feedback repository; both backends import feedback.json on first run
+FEEDBACK_BACKEND = os.getenv("FEEDBACK_BACKEND", "sqlite").lower()
+
+feedback_store = create_feedback_repository(FEEDBACK_BACKEND, data_dir)
+
+# Running sentiment aggregates, rebuilt from storage by the warm-up
+sentiment_aggregates = SentimentAggregates()
+
+# Trending keywords per hour, rebuilt from the retained window of storage by the warm-up
+trending_index = TrendingIndex(
+    bucket_seconds=int(os.getenv("TRENDING_BUCKET_SECONDS", 3600)),
+    retention_buckets=int(os.getenv("TRENDING_RETENTION_BUCKETS", 48)),
+    capacity=int(os.getenv("TRENDING_TERMS_PER_BUCKET", 64)),
+    max_categories=int(os.getenv("TRENDING_MAX_CATEGORIES", 20))
+)
 
-# Initialize feedback file if it doesn't exist
-if not os.path.exists(feedback_file):
-    with open(feedback_file, "w") as f:
-        json.dump([], f)
+def rebuild_trending_index():
+    since = datetime.fromtimestamp(time.time() - trending_index.retention_seconds).isoformat()
+    with span("storage.rebuild_trending"):
+        trending_index.rebuild(feedback_store.iter_records(start=since))
+
+# Near-duplicate clusters of recent feedback (MinHash/LSH), rebuilt from the window by the warm-up
+NEAR_DUPLICATE_DETECTION = os.getenv("NEAR_DUPLICATE_DETECTION", "true").lower() == "true"
+near_duplicate_index = NearDuplicateIndex(
+    threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.8)),
+    window_seconds=float(os.getenv("NEAR_DUPLICATE_WINDOW_SECONDS", 24 * 3600)),
+    max_clusters=int(os.getenv("NEAR_DUPLICATE_MAX_CLUSTERS", 50000))
+)
+
+def rebuild_near_duplicate_index():
+    if not NEAR_DUPLICATE_DETECTION:
+        return
+    since = datetime.fromtimestamp(time.time() - near_duplicate_index.window_seconds).isoformat()
+    with span("storage.rebuild_near_duplicates"):
+        near_duplicate_index.rebuild(feedback_store.iter_records(start=since))
+
+# Helper function to rebuild every in-memory index from storage
+def rebuild_feedback_indexes():
+    with span("storage.rebuild_aggregates"):
+        sentiment_aggregates.rebuild(feedback_store.iter_records())
+    rebuild_trending_index()
+    rebuild_near_duplicate_index()
 
 # Helper function to load feedback data
 def load_feedback_data():
-    try:
-        with open(feedback_file, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    with span("storage.load"):
+        return feedback_store.all()
 
-# Helper function to save feedback data
+# Helper function to save feedback data (replaces the stored corpus)
 def save_feedback_data(data):
-    with open(feedback_file, "w") as f:
-        json.dump(data, f, indent=2)
+    with span("storage.save"):
+        feedback_store.rewrite(data)
+    sentiment_aggregates.rebuild(data)
+    rebuild_trending_index()
+    rebuild_near_duplicate_index()
+
+# Helper function to fold newly stored feedback records into the in-memory indexes
+def index_stored_feedback(records):
+    for record in records:
+        sentiment_aggregates.add(record)
+        trending_index.add(record)
+
+# All feedback writes go through one writer thread that stores queued records
+# in group commits; a request returns only after its group is stored
+feedback_writer = GroupCommitWriter(
+    feedback_store,
+    on_flush=index_stored_feedback,
+    max_batch=int(os.getenv("FEEDBACK_GROUP_COMMIT_MAX_BATCH", 512)),
+    max_delay=float(os.getenv("FEEDBACK_GROUP_COMMIT_DELAY_MS", 5)) / 1000
+)
+
+# Helper function to build the stored record for a scored feedback item
+def build_feedback_record(feedback, sentiment_result):
+    record_id = str(uuid.uuid4())
+    cluster_id = None
+    if NEAR_DUPLICATE_DETECTION:
+        with span("feedback.near_duplicates"):
+            cluster_id = near_duplicate_index.assign(record_id, feedback.text)
+    return {
+        "id": record_id,
+        "text": feedback.text,
+        "category": feedback.category,
+        "user_id": feedback.user_id,
+        "sentiment": sentiment_result["sentiment"],
+        "score": sentiment_result["score"],
+        "timestamp": datetime.now().isoformat(),
+        "scorer_version": SCORER_VERSION,
+        "cluster_id": cluster_id
+    }
+
+# Helper function to store feedback records; clusters they started are
+# forgotten again if the write fails
+async def store_feedback_records(records):
+    try:
+        await feedback_writer.write_many(records)
+    except Exception:
+        for record in records:
+            if record["cluster_id"] == record["id"]:
+                near_duplicate_index.discard(record["id"])
+        raise
+
+# Worker processes serving the API, as declared to uvicorn or gunicorn in WEB_CONCURRENCY.
+# Chat sessions can be shared between workers (SESSION_BACKEND=sqlite), but the
+# feedback indexes (aggregates, trending, near-duplicates) live in each process:
+# with several workers each would count only the feedback written through it.
+# The feedback endpoints are therefore refused there; serve them from a separate
+# single-worker instance on the same data directory. The answer cache is per
+# process too, which only lowers its hit rate.
+API_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+
+# Helper function to reject requests that rely on the in-process feedback indexes
+def require_single_worker():
+    if API_WORKERS > 1:
+        raise HTTPException(status_code=503, detail="Feedback endpoints need a single-worker API instance")
+
+FEEDBACK_BATCH_MAX_ITEMS = int(os.getenv("FEEDBACK_BATCH_MAX_ITEMS", 10000))
+
+# Per-client token buckets for /chat and /chat/stream; CHAT_RATE_LIMIT requests per second (0 disables)
+chat_rate_limiter = ClientRateLimiter(
+    rate=float(os.getenv("CHAT_RATE_LIMIT", 0)),
+    burst=int(os.getenv("CHAT_RATE_BURST", 20)),
+    max_clients=int(os.getenv("CHAT_RATE_MAX_CLIENTS", 10000))
+)
+# Peers (e.g. a reverse proxy or the frontend) whose X-Client-Id header names the end client
+CHAT_TRUSTED_PROXIES = frozenset(filter(None, (ip.strip() for ip in os.getenv("CHAT_TRUSTED_PROXIES", "").split(","))))
+
+# Helper function to identify the client a chat request is rate limited as.
+# Anyone else could dodge the limit by rotating the header, so it is only
+# honoured from a trusted proxy
+def chat_client_id(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    if peer in CHAT_TRUSTED_PROXIES:
+        return request.headers.get("X-Client-Id") or peer
+    return peer
+
+# Helper function to apply the per-client chat rate limit
+def enforce_chat_rate_limit(request: Request):
+    retry_after = chat_rate_limiter.acquire(chat_client_id(request))
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many chat requests",
+                            headers={"Retry-After": str(max(1, round(retry_after)))})
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Citizen AI API"}
 
+@app.get("/ready")
+async def ready():
+    # Readiness probe: 200 once the warm-up has loaded every component
+    is_ready = all(readiness.values())
+    return JSONResponse({"ready": is_ready, "components": dict(readiness)}, status_code=200 if is_ready else 503)
+
+# Helper function to answer a delta request whose history has diverged
+def resync_response(error: SessionOutOfSyncError):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "resync", "client_seq": error.client_seq, "server_seq": error.server_seq}
+    )
+
 @app.post("/chat", response_model=Dict[str, Any])
-async def chat(chat_message: ChatMessage):
+async def chat(chat_message: ChatMessage, request: Request, response: Response):
+    enforce_chat_rate_limit(request)
+    session_id = chat_message.session_id or str(uuid.uuid4())
+    try:
+        answer, source = await get_ai_response_with_source(
+            chat_message.message, session_id, chat_message.context, chat_message.seq
+        )
+        # Which path answered: cache, llm, fallback or degraded (shed under overload)
+        response.headers["X-Served-By"] = source
+        return {"response": answer, "session_id": session_id, "seq": await session_call(session_store.seq, session_id)}
+    except SessionOutOfSyncError as e:
+        return resync_response(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, request: Request):
+    # Server-Sent Events: one "token" event per piece, then a "done" event
+    enforce_chat_rate_limit(request)
+    session_id = chat_message.session_id or str(uuid.uuid4())
     try:
-        response = await get_ai_response(chat_message.message, chat_message.session_id, chat_message.context)
-        return {"response": response, "session_id": chat_message.session_id or str(uuid.uuid4())}
+        source, pieces = await stream_ai_response_with_source(
+            chat_message.message, session_id, chat_message.context, chat_message.seq
+        )
+    except SessionOutOfSyncError as e:
+        return resync_response(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def events():
+        try:
+            async for piece in pieces:
+                yield f"event: token\ndata: {json.dumps({'token': piece})}\n\n"
+            seq = await session_call(session_store.seq, session_id)
+            yield f"event: done\ndata: {json.dumps({'session_id': session_id, 'seq': seq})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        finally:
+            await pieces.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # X-Served-By as for /chat; a stream cut short after it started is not reflected
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Served-By": source}
+    )
+
+@app.get("/chat/sessions/stats")
+def get_session_stats():
+    return session_store.stats()
+
+@app.get("/chat/admission/stats")
+async def chat_admission_stats():
+    return {**chat_admission.stats(), "rate_limit": chat_rate_limiter.stats()}
+
+@app.get("/chat/cache/stats")
+async def get_answer_cache_stats():
+    return answer_cache.stats()
+
 @app.post("/feedback", response_model=SentimentResponse)
 async def submit_feedback(feedback: FeedbackItem):
-    # Analyze sentiment
-    sentiment_result = analyze_sentiment(feedback.text)
-    
-    # Create response with timestamp and ID
-    timestamp = datetime.now().isoformat()
-    feedback_id = str(uuid.uuid4())
+    require_single_worker()
+    # Analyze sentiment off the event loop
+    try:
+        sentiment_result = await sentiment_executor.analyze(feedback.text)
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     
-    # Create response object
-    response = {
-        "id": feedback_id,
-        "text": feedback.text,
-        "category": feedback.category,
-        "user_id": feedback.user_id,
-        "sentiment": sentiment_result["sentiment"],
-        "score": sentiment_result["score"],
-        "timestamp": timestamp
-    }
+    # Create response object with timestamp and ID; hashing for near-duplicates runs off the loop too
+    response = await run_in_threadpool(build_feedback_record, feedback, sentiment_result)
     
-    # Save to file
-    data = load_feedback_data()
-    data.append(response)
-    save_feedback_data(data)
+    # Append to the feedback log
+    await store_feedback_records([response])
     
     return response
 
+@app.post("/feedback/batch")
+async def submit_feedback_batch(request: Request):
+    require_single_worker()
+    # Accepts a JSON array of FeedbackItems, or NDJSON (one item per line)
+    # when the Content-Type is application/x-ndjson
+    started = time.perf_counter()
+    raw_items = []
+    if "ndjson" in request.headers.get("content-type", ""):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            raw_items.extend(line for line in lines if line.strip())
+            if len(raw_items) > FEEDBACK_BATCH_MAX_ITEMS:
+                break
+        if buffer.strip():
+            raw_items.append(buffer)
+    else:
+        try:
+            raw_items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of feedback items")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of feedback items")
+
+    if len(raw_items) > FEEDBACK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {FEEDBACK_BATCH_MAX_ITEMS} items per batch")
+
+    items = []
+    for index, raw in enumerate(raw_items):
+        try:
+            item = json.loads(raw) if isinstance(raw, bytes) else raw
+            items.append(FeedbackItem(**item))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid feedback item at index {index}: {e}")
+
+    # Score in chunks across the executor's workers, then persist in one transaction
+    try:
+        sentiment_results = await sentiment_executor.analyze_batch([item.text for item in items])
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    # Clustering a large batch takes a while; keep it off the event loop
+    records = await run_in_threadpool(
+        lambda: [build_feedback_record(item, result) for item, result in zip(items, sentiment_results)]
+    )
+    if records:
+        await store_feedback_records(records)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "items": [{"id": r["id"], "sentiment": r["sentiment"], "score": r["score"], "cluster_id": r["cluster_id"]}
+                  for r in records],
+        "count": len(records),
+        "elapsed_ms": elapsed * 1000,
+        "items_per_second": len(records) / elapsed if elapsed > 0 else 0.0
+    }
+
+@app.get("/feedback/writer/stats")
+async def get_feedback_writer_stats():
+    return feedback_writer.stats()
+
+@app.get("/feedback/duplicates/stats")
+async def get_near_duplicate_stats():
+    require_single_worker()
+    return {"enabled": NEAR_DUPLICATE_DETECTION, **near_duplicate_index.stats()}
+
 @app.get("/feedback", response_model=List[Dict[str, Any]])
-async def get_feedback():
-    return load_feedback_data()
+def get_feedback(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    order: str = "asc"
+):
+    # Without parameters this returns the whole corpus, oldest first, as before.
+    # With `limit`, the cursor for the next page is sent in the X-Next-Cursor header.
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    try:
+        with span("storage.list"):
+            records, next_cursor = feedback_store.list(
+                limit=limit,
+                cursor=cursor,
+                category=category,
+                sentiment=sentiment.lower() if sentiment else None,
+                start=start.isoformat() if start else None,
+                end=end.isoformat() if end else None,
+                descending=order == "desc"
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return records
+
+# Helper function to check whether the client accepts a gzip-encoded response
+def accepts_gzip(request: Request) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+@app.get("/feedback/export")
+def export_feedback(
+    request: Request,
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    sentiment: Optional[str] = None
+):
+    # Streams the matching records oldest first in batches; memory use does not grow with the corpus
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    records = feedback_store.iter_records(
+        start=start.isoformat() if start else None,
+        end=end.isoformat() if end else None,
+        category=category,
+        sentiment=sentiment.lower() if sentiment else None
+    )
+    writer = {"ndjson": export_ndjson, "csv": export_csv, "parquet": export_parquet}[format]
+    media_type, extension = EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="feedback.{extension}"', "Vary": "Accept-Encoding"}
+    body = writer(records)
+    # Parquet pages are already compressed
+    if format != "parquet" and accepts_gzip(request):
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+@app.get("/feedback/search", response_model=List[Dict[str, Any]])
+def search_feedback(
+    response: Response,
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    # Best matches first (BM25); the cursor for the next page is sent in the X-Next-Cursor header
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    try:
+        with span("storage.search"):
+            records, next_cursor = feedback_store.search(
+                q,
+                limit=limit,
+                cursor=cursor,
+                category=category,
+                sentiment=sentiment.lower() if sentiment else None,
+                start=start.isoformat() if start else None,
+                end=end.isoformat() if end else None
+            )
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return records
+
+@app.get("/feedback/trending")
+def get_trending_keywords(
+    window: str = "24h",
+    sentiment: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = 10
+):
+    # Served from the in-memory trending index; no storage access
+    require_single_worker()
+    try:
+        seconds = parse_window(window)
+        result = trending_index.top(
+            seconds,
+            sentiment=sentiment.lower() if sentiment else None,
+            category=category,
+            limit=max(1, min(limit, 100))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"window": window, "sentiment": sentiment, "category": category, **result}
 
 @app.get("/sentiment/summary")
-async def get_sentiment_summary():
-    data = load_feedback_data()
-    
-    if not data:
-        return {"positive": 0, "neutral": 0, "negative": 0, "total": 0}
-    
-    # Count sentiments
-    sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0}
-    for item in data:
-        sentiment = item.get("sentiment", "neutral").lower()
-        if sentiment in sentiment_counts:
-            sentiment_counts[sentiment] += 1
-    
-    # Add total
-    sentiment_counts["total"] = len(data)
-    
-    return sentiment_counts
+async def get_sentiment_summary(dedupe: bool = False):
+    # Served from the running aggregates; no storage access. With dedupe,
+    # each near-duplicate cluster counts once
+    require_single_worker()
+    return sentiment_aggregates.summary(dedupe=dedupe)
+
+# Maintenance endpoints rescan the whole corpus; they exist only when MAINTENANCE_ENDPOINTS_ENABLED=true
+MAINTENANCE_ENDPOINTS_ENABLED = os.getenv("MAINTENANCE_ENDPOINTS_ENABLED", "false").lower() == "true"
+
+@app.post("/feedback/aggregates/rebuild")
+def rebuild_feedback_aggregates():
+    # Called after stored scores change outside the API (python -m utils.rescore).
+    # The indexes keep serving and taking writes while the new ones are built
+    if not MAINTENANCE_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    require_single_worker()
+    started = time.perf_counter()
+    rebuild_feedback_indexes()
+    return {"records": sentiment_aggregates.total, "seconds": time.perf_counter() - started}
+
+# Changes on every restart so ETags from a previous process never match
+BOOT_ID = uuid.uuid4().hex[:8]
+
+@app.get("/dashboard/aggregates")
+def get_dashboard_aggregates(request: Request, recent: int = 5):
+    # Everything the dashboard renders, precomputed; revalidate with If-None-Match
+    require_single_worker()
+    recent = max(0, min(recent, 100))
+    etag = f'"{BOOT_ID}-{sentiment_aggregates.version}-{recent}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    summary = sentiment_aggregates.summary()
+    recent_items = feedback_store.list(limit=recent, descending=True)[0] if recent else []
+    payload = {
+        "sentiment_counts": {label: summary[label] for label in ("positive", "neutral", "negative")},
+        "total": summary["total"],
+        "daily": sentiment_aggregates.timeseries("day"),
+        "categories": summary["categories"],
+        "recent": recent_items
+    }
+    return JSONResponse(payload, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/sentiment/cache")
+async def get_sentiment_cache_stats():
+    return sentiment_cache.stats()
+
+@app.get("/sentiment/timeseries")
+async def get_sentiment_timeseries(
+    bucket: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    require_single_worker()
+    try:
+        return sentiment_aggregates.timeseries(
+            bucket,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Gauges read at scrape time
+registry.gauge("citizen_ai_feedback_records", "Stored feedback records", lambda: sentiment_aggregates.total)
+registry.gauge("citizen_ai_feedback_write_queue", "Feedback records waiting for a group commit",
+               lambda: feedback_writer.stats()["queued"])
+registry.gauge("citizen_ai_near_duplicate_clusters", "Near-duplicate clusters in the window",
+               lambda: near_duplicate_index.stats()["clusters"])
+registry.gauge("citizen_ai_chat_sessions", "Live chat sessions", lambda: session_store.stats()["sessions"])
+registry.gauge("citizen_ai_chat_session_bytes", "Approximate memory held by chat sessions",
+               lambda: session_store.stats()["total_bytes"])
+registry.gauge("citizen_ai_sentiment_cache_entries", "Sentiment results cached in memory",
+               lambda: sentiment_cache.stats()["size"])
+registry.gauge("citizen_ai_chat_queue", "Chat requests waiting for a Gemini slot",
+               lambda: chat_admission.stats()["waiting"])
+registry.gauge("citizen_ai_answer_cache_entries", "Cached upstream chat answers", lambda: answer_cache.stats()["size"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Sampling profiler for capturing hot paths; the endpoints exist only when PROFILER_ENABLED=true
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+profiler = SamplingProfiler(interval=float(os.getenv("PROFILER_INTERVAL", 0.01)))
+
+# Helper function to reject profiler requests unless the profiler is enabled
+def require_profiler():
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.post("/debug/profiler/start")
+def start_profiler(interval: Optional[float] = None):
+    require_profiler()
+    if interval is not None and not 0.001 <= interval <= 1.0:
+        raise HTTPException(status_code=400, detail="interval must be between 0.001 and 1 seconds")
+    profiler.start(interval)
+    return profiler.status()
+
+@app.post("/debug/profiler/stop")
+def stop_profiler():
+    require_profiler()
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/debug/profiler")
+def get_profile(format: str = "status"):
+    # format=collapsed returns the samples for flame graph tools
+    require_profiler()
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return profiler.status()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,117 @@
+"""
+Drive /chat at an open-loop arrival rate well above what the (fake) Gemini
+API can serve, and compare the tail latency with admission control off and
+on. Capacity is LLM_MAX_CONCURRENCY / latency requests per second; requests
+arrive at --overload times that rate whether or not earlier ones finished.
+
+Modes:
+    off         Every request queues for Gemini (CHAT_ADMISSION_CONTROL=false)
+    on          Requests that would wait longer than --slo get a local answer
+    rate-limit  As "on", with one greedy client sending half of the traffic
+                and per-client rate limits (CHAT_RATE_LIMIT) enabled
+
+Each row lists latency percentiles over all answered requests, the polite
+clients' p99, and how many requests each path (X-Served-By) or a 429 answered.
+With --stream the requests go to /chat/stream and a latency runs until the
+whole stream has been read.
+
+Usage:
+    python benchmarks/chat_overload.py [--modes off,on,rate-limit] [--latency 0.5]
+        [--concurrency 4] [--overload 3] [--duration 10] [--slo 0.5] [--stream]
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from common import ApiServer, FakeGeminiServer, percentile, summarize
+
+POLITE_CLIENTS = 20
+
+
+def mode_env(mode: str, args) -> dict:
+    env = {
+        "LLM_MAX_CONCURRENCY": str(args.concurrency),
+        "CHAT_QUEUE_SLO": str(args.slo),
+        "CHAT_ADMISSION_CONTROL": "false" if mode == "off" else "true"
+    }
+    if mode == "rate-limit":
+        # Well above a polite client's share, well below the greedy one's. The
+        # load generator stands in for a proxy naming its clients in X-Client-Id
+        env.update({"CHAT_RATE_LIMIT": str(args.rate_limit), "CHAT_RATE_BURST": "5",
+                    "CHAT_TRUSTED_PROXIES": "127.0.0.1"})
+    return env
+
+
+async def send(client: httpx.AsyncClient, path: str, i: int, client_id: str, results: list):
+    # One earlier turn in the context keeps the answer cache out of the measurement
+    context = [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi, how can I help?"}]
+    t0 = time.perf_counter()
+    try:
+        response = await client.post(path, headers={"X-Client-Id": client_id}, json={
+            "message": f"How do I renew my parking permit? (request {i})", "session_id": f"overload-{i}",
+            "context": context
+        })
+        served_by = "429" if response.status_code == 429 else response.headers.get("X-Served-By", str(response.status_code))
+    except httpx.HTTPError as e:
+        served_by = type(e).__name__
+    results.append((client_id, served_by, time.perf_counter() - t0))
+
+
+async def run_mode(url: str, mode: str, args) -> dict:
+    rate = args.overload * args.concurrency / args.latency
+    total = int(rate * args.duration)
+    results = []
+    limits = httpx.Limits(max_connections=total, max_keepalive_connections=64)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            # Open loop: the schedule does not wait for answers
+            await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+            greedy = mode == "rate-limit" and i % 2 == 0
+            client_id = "greedy" if greedy else f"polite-{i % POLITE_CLIENTS}"
+            tasks.append(asyncio.create_task(send(client, args.path, i, client_id, results)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    answered = [latency for _, served_by, latency in results if served_by != "429"]
+    polite = [latency for client_id, served_by, latency in results if client_id != "greedy" and served_by != "429"]
+    return {
+        "rate": rate,
+        **summarize(answered, elapsed),
+        "polite_p99_ms": percentile(polite, 99) * 1000,
+        "served_by": Counter(served_by for _, served_by, _ in results)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="off,on,rate-limit")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the fake Gemini API takes per answer")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM_MAX_CONCURRENCY of the API")
+    parser.add_argument("--overload", type=float, default=3.0, help="Arrival rate as a multiple of capacity")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of arrivals")
+    parser.add_argument("--slo", type=float, default=0.5, help="CHAT_QUEUE_SLO of the API")
+    parser.add_argument("--rate-limit", type=float, default=2.0, help="CHAT_RATE_LIMIT in the rate-limit mode")
+    parser.add_argument("--stream", action="store_true", help="Send the requests to /chat/stream")
+    args = parser.parse_args()
+    args.path = "/chat/stream" if args.stream else "/chat"
+
+    capacity = args.concurrency / args.latency
+    print(f"{args.path}: capacity {capacity:.1f} req/s, arrivals {args.overload * capacity:.1f} req/s for {args.duration:.0f} s, "
+          f"queueing SLO {args.slo * 1000:.0f} ms")
+    print(f"{'mode':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'polite p99':>12}  served by")
+    with FakeGeminiServer(latency=args.latency) as gemini:
+        for mode in args.modes.split(","):
+            with ApiServer(env={**gemini.api_env(), **mode_env(mode, args)}) as server:
+                stats = asyncio.run(run_mode(server.url, mode, args))
+            served_by = ", ".join(f"{source}={count}" for source, count in sorted(stats["served_by"].items()))
+            print(f"{mode:<12}{stats['p50_ms']:>10.0f}{stats['p95_ms']:>10.0f}{stats['p99_ms']:>10.0f}"
+                  f"{stats['max_ms']:>10.0f}{stats['polite_p99_ms']:>12.0f}  {served_by}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Multi-turn conversations against several uvicorn workers, once per session
+backend. Clients use the delta protocol (message plus seq), so every turn
+that lands on a worker without the session's history comes back as a 409
+resync. The script counts those and reports /chat throughput and latency.
+
+Usage:
+    python benchmarks/chat_sessions_multiworker.py [--workers 4] [--backends memory,sqlite]
+        [--conversations 32] [--turns 10]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from common import ApiServer, summarize
+
+MESSAGES = ["Hello", "How do I pay my property tax?", "What about parking permits?",
+            "Which bus goes downtown?", "Thanks, and the library hours?"]
+
+
+async def conversation(client: httpx.AsyncClient, number: int, turns: int, latencies: list, counts: dict):
+    session_id = f"bench-{number}-{time.time_ns()}"
+    history = []
+    for turn in range(turns):
+        message = MESSAGES[turn % len(MESSAGES)]
+        t0 = time.perf_counter()
+        response = await client.post("/chat", json={"message": message, "session_id": session_id, "seq": len(history)})
+        if response.status_code == 409:
+            counts["resyncs"] += 1
+            response = await client.post("/chat", json={
+                "message": message, "session_id": session_id, "seq": len(history), "context": history
+            })
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": response.json()["response"]}]
+        if response.json()["seq"] != len(history):
+            counts["seq_mismatches"] += 1
+
+
+async def run(url: str, args) -> dict:
+    latencies, counts = [], {"resyncs": 0, "seq_mismatches": 0}
+    # A fresh connection per request, the way a load balancer spreads them over workers
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(conversation(client, n, args.turns, latencies, counts)
+                               for n in range(args.conversations)))
+        elapsed = time.perf_counter() - start
+    return {**summarize(latencies, elapsed), **counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backends", default="memory,sqlite")
+    parser.add_argument("--conversations", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.conversations} conversations x {args.turns} turns")
+    print(f"{'backend':<10}{'turns/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'resyncs':>10}{'seq errs':>10}")
+    for backend in args.backends.split(","):
+        with ApiServer(env={"SESSION_BACKEND": backend}, workers=args.workers) as server:
+            result = asyncio.run(run(server.url, args))
+        print(f"{backend:<10}{result['throughput_per_s']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['resyncs']:>10}{result['seq_mismatches']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure /chat latency while a flood of long feedback submissions is running,
+once per sentiment executor mode. Each mode gets its own uvicorn server.
+
+Usage:
+    python benchmarks/chat_under_feedback_flood.py [--modes inline,thread,process]
+        [--flood-concurrency 32] [--chat-requests 200] [--text-words 400]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from common import ApiServer, summarize
+
+LONG_TEXT_WORDS = ["the", "bus", "was", "late", "again", "and", "the", "driver", "was", "rude",
+                   "but", "the", "new", "park", "is", "wonderful", "and", "clean"]
+
+
+async def flood(client: httpx.AsyncClient, text: str, stop: asyncio.Event):
+    while not stop.is_set():
+        response = await client.post("/feedback", json={"text": text, "category": "General"})
+        if response.status_code == 503:
+            await asyncio.sleep(0.01)
+
+
+async def measure_chat(client: httpx.AsyncClient, requests: int):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        response = await client.post("/chat", json={"message": "How do I renew my permit?", "session_id": f"bench-{i}"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+async def run_mode(url: str, args) -> dict:
+    text = " ".join(LONG_TEXT_WORDS[i % len(LONG_TEXT_WORDS)] for i in range(args.text_words))
+    limits = httpx.Limits(max_connections=args.flood_concurrency + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        stop = asyncio.Event()
+        flooders = [asyncio.create_task(flood(client, text, stop)) for _ in range(args.flood_concurrency)]
+        await asyncio.sleep(1.0)
+        latencies, elapsed = await measure_chat(client, args.chat_requests)
+        stop.set()
+        await asyncio.gather(*flooders)
+    return summarize(latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="inline,thread,process")
+    parser.add_argument("--flood-concurrency", type=int, default=32)
+    parser.add_argument("--chat-requests", type=int, default=200)
+    parser.add_argument("--text-words", type=int, default=400)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for mode in args.modes.split(","):
+        with ApiServer(env={"SENTIMENT_EXECUTOR": mode}) as server:
+            stats = asyncio.run(run_mode(server.url, args))
+        print(f"{mode:<10}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the API, to
+answer its first request and to report ready (analyzers loaded and feedback
+indexes rebuilt from storage).
+
+Each run starts a new interpreter, so nothing is shared between runs. With
+--sizes the phases are measured on a seeded corpus of each size too (phase
+names get a ".N" suffix); import and first response should not grow with it.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5] [--sizes 0,200000] [--importtime]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+from common import REPO_ROOT, free_port, seed_corpus, summarize
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def _environment(corpus_dir: Optional[str] = None) -> Dict[str, str]:
+    # A fresh copy of the seeded corpus per run, so no run sees another's writes
+    data_dir = tempfile.mkdtemp(prefix="citizen-ai-bench-")
+    if corpus_dir:
+        shutil.copytree(corpus_dir, data_dir, dirs_exist_ok=True)
+    return {
+        **os.environ,
+        "CITIZEN_AI_DATA_DIR": data_dir,
+        "GEMINI_API_KEY": os.environ.get("BENCH_GEMINI_API_KEY", ""),
+        "PYTHONPATH": REPO_ROOT
+    }
+
+
+def measure_import(runs: int, corpus_dir: Optional[str] = None) -> List[float]:
+    """Seconds spent in `import app.main`, one fresh interpreter per run."""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=REPO_ROOT, env=_environment(corpus_dir),
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def _wait_for(url: str, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer in time")
+
+
+def measure_server(runs: int, corpus_dir: Optional[str] = None) -> Dict[str, List[float]]:
+    """Seconds from spawning uvicorn until / answers and until /ready reports 200."""
+    first_response, ready = [], []
+    for _ in range(runs):
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=REPO_ROOT, env=_environment(corpus_dir)
+        )
+        try:
+            first_response.append(_wait_for(url + "/", started + 120) - started)
+            ready.append(_wait_for(url + "/ready", started + 600) - started)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return {"first_response": first_response, "ready": ready}
+
+
+def run_cold_start(runs: int, sizes: Sequence[int] = (0,)) -> Dict[str, dict]:
+    """
+    Results in the format of benchmarks/run.py, keyed "cold_start.<phase>"
+    for an empty corpus and "cold_start.<phase>.<size>" for a seeded one.
+    """
+    results = {}
+    for size in sizes:
+        corpus_dir = None
+        if size:
+            corpus_dir = tempfile.mkdtemp(prefix="citizen-ai-corpus-")
+            seed_corpus(corpus_dir, size)
+        try:
+            phases = {"import": measure_import(runs, corpus_dir), **measure_server(runs, corpus_dir)}
+        finally:
+            if corpus_dir:
+                shutil.rmtree(corpus_dir, ignore_errors=True)
+        suffix = f".{size}" if size else ""
+        results.update({f"cold_start.{phase}{suffix}": summarize(timings, sum(timings))
+                        for phase, timings in phases.items()})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sizes", default="0", help="Comma-separated corpus sizes (0 is an empty corpus)")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports (python -X importtime)")
+    args = parser.parse_args()
+
+    print(f"{'phase':<34}{'p50 ms':>10}{'max ms':>10}")
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    for name, result in run_cold_start(args.runs, sizes).items():
+        print(f"{name:<34}{result['p50_ms']:>10.0f}{result['max_ms']:>10.0f}")
+
+    if args.importtime:
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=REPO_ROOT,
+                                env=_environment(), capture_output=True, text=True).stderr
+        rows = [line.split("|") for line in stderr.splitlines() if line.startswith("import time:") and "cumulative" not in line]
+        rows.sort(key=lambda row: int(row[1]), reverse=True)
+        print("\nSlowest imports (cumulative ms):")
+        for row in rows[:15]:
+            print(f"  {int(row[1]) / 1000:>8.1f}  {row[2].rstrip()}")
+
+
+if __name__ == "__main__":
+    main()
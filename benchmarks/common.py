@@ -0,0 +1,181 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the repository root importable when running `python benchmarks/<script>.py`
+sys.path.append(REPO_ROOT)
+
+from utils.storage import SqliteFeedbackRepository
+
+WORDS = ["the", "bus", "was", "late", "again", "park", "is", "clean", "and", "lovely", "pothole",
+         "on", "main", "street", "still", "not", "fixed", "great", "service", "at", "library",
+         "garbage", "pickup", "missed", "water", "bill", "too", "high", "thanks", "staff"]
+CATEGORIES = ["Transport", "Parks", "Roads", "Sanitation", "Utilities", None]
+SENTIMENTS = [("positive", 0.4), ("neutral", 0.0), ("negative", -0.4)]
+
+
+def random_text(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed_corpus(data_dir: str, size: int, seed: int = 7):
+    """Write `size` synthetic records straight into the SQLite store the server will open."""
+    rng = random.Random(seed)
+    store = SqliteFeedbackRepository(os.path.join(data_dir, "feedback.db"))
+    start = datetime.now() - timedelta(days=90)
+    batch = []
+    for i in range(size):
+        sentiment, score = rng.choice(SENTIMENTS)
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "text": random_text(rng),
+            "category": rng.choice(CATEGORIES),
+            "user_id": None,
+            "sentiment": sentiment,
+            "score": score,
+            "timestamp": (start + timedelta(seconds=i * 7776000 / max(size, 1))).isoformat()
+        })
+        if len(batch) == 10000:
+            store.append_many(batch)
+            batch = []
+    if batch:
+        store.append_many(batch)
+
+
+def isolate_environment():
+    """
+    Point the API at a throwaway data directory and disable the Gemini API,
+    so benchmarks never touch real data or make network calls.
+    Must be called before importing `app.main`.
+    """
+    os.environ.setdefault("CITIZEN_AI_DATA_DIR", tempfile.mkdtemp(prefix="citizen-ai-bench-"))
+    os.environ["GEMINI_API_KEY"] = os.environ.get("BENCH_GEMINI_API_KEY", "")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ApiServer:
+    """
+    Runs the API under uvicorn in a subprocess with an isolated data directory.
+
+    Args:
+        env: Extra environment variables for the server process
+        workers: Number of uvicorn worker processes
+        startup_timeout: Seconds to wait for the server, e.g. while it loads a large corpus
+    """
+
+    def __init__(self, env: Optional[Dict[str, str]] = None, workers: int = 1, startup_timeout: float = 60):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {
+            **os.environ,
+            "CITIZEN_AI_DATA_DIR": tempfile.mkdtemp(prefix="citizen-ai-bench-"),
+            "GEMINI_API_KEY": os.environ.get("BENCH_GEMINI_API_KEY", ""),
+            # Tells the API how many workers share its data (see API_WORKERS in app/main.py)
+            "WEB_CONCURRENCY": str(workers),
+            **(env or {})
+        }
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self) -> "ApiServer":
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=REPO_ROOT, env=self.env
+        )
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            try:
+                # Wait until the analyzers are warm, so they are not part of the measurements
+                if httpx.get(self.url + "/ready").status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError("API server did not start")
+
+    def __exit__(self, *exc):
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+class FakeGeminiServer:
+    """
+    Runs benchmarks/fake_gemini.py in a subprocess.
+
+    Args:
+        latency: Seconds before each reply starts
+        jitter: Uniform +/- jitter in seconds
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.latency = latency
+        self.jitter = jitter
+        self.process = None
+
+    def __enter__(self) -> "FakeGeminiServer":
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_ROOT, "benchmarks", "fake_gemini.py"), "--port", str(self.port),
+             "--latency", str(self.latency), "--jitter", str(self.jitter)],
+            cwd=REPO_ROOT
+        )
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                httpx.get(self.url + "/")
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError("Fake Gemini server did not start")
+
+    def __exit__(self, *exc):
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+    def api_env(self) -> Dict[str, str]:
+        """Environment variables that point the API at this server."""
+        return {"GEMINI_API_KEY": "fake", "GEMINI_API_ENDPOINT": self.url}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (pct in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Throughput and latency percentiles (milliseconds) for a list of latencies in seconds."""
+    return {
+        "count": len(latencies),
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0
+    }
@@ -0,0 +1,88 @@
+"""
+Local stand-in for the Gemini REST API with injectable latency and errors.
+
+Implements `generateContent` and `streamGenerateContent` for any model name,
+answering with a deterministic reply built from the last user message.
+
+Usage:
+    python benchmarks/fake_gemini.py [--port 8081] [--latency 0.5] [--jitter 0.1] [--error-rate 0.0]
+
+Point the API at it with:
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8081 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+settings = {"latency": 0.5, "jitter": 0.0, "error_rate": 0.0, "chunk_words": 4}
+
+app = FastAPI(title="Fake Gemini")
+
+
+def reply_text(body: dict) -> str:
+    contents = body.get("contents") or [{}]
+    parts = contents[-1].get("parts") or [{}]
+    prompt = parts[-1].get("text", "")
+    return f"This is a simulated answer about: {prompt}. Please contact your local office for details."
+
+
+def candidate(text: str, finished: bool = True) -> dict:
+    result = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+    if finished:
+        result["candidates"][0]["finishReason"] = "STOP"
+    return result
+
+
+async def simulate_latency():
+    await asyncio.sleep(max(0.0, settings["latency"] + random.uniform(-settings["jitter"], settings["jitter"])))
+    if random.random() < settings["error_rate"]:
+        return JSONResponse({"error": {"code": 503, "message": "Injected failure", "status": "UNAVAILABLE"}}, status_code=503)
+    return None
+
+
+@app.post("/v1beta/models/{model_action:path}")
+async def model_action(model_action: str, request: Request):
+    body = await request.json()
+    error = await simulate_latency()
+    if error is not None:
+        return error
+    text = reply_text(body)
+
+    if model_action.endswith(":streamGenerateContent"):
+        words = text.split(" ")
+        size = settings["chunk_words"]
+
+        async def stream():
+            # The REST transport reads the stream as one JSON array of responses
+            yield "["
+            for i in range(0, len(words), size):
+                if i:
+                    yield ","
+                    await asyncio.sleep(settings["latency"] / 10)
+                chunk = " ".join(words[i:i + size]) + (" " if i + size < len(words) else "")
+                yield json.dumps(candidate(chunk, finished=i + size >= len(words)))
+            yield "]"
+
+        return StreamingResponse(stream(), media_type="application/json")
+    return candidate(text)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+    settings.update(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
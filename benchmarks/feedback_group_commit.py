@@ -0,0 +1,131 @@
+"""
+Concurrency stress test for feedback persistence. Many concurrent writers
+store records once with one storage call per record and once through the
+group-commit writer. The test then checks that every acknowledged record is
+stored exactly once, and reports the throughput.
+
+With --http, it also floods POST /feedback on a real server and checks that
+the stored corpus and the running summary both count every acknowledged submission.
+
+Usage:
+    python benchmarks/feedback_group_commit.py [--writers 64] [--records 50]
+        [--backends sqlite-normal,sqlite-full,log,log-fsync] [--http]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+
+from common import ApiServer, summarize
+from utils.storage import FeedbackLog, SqliteFeedbackRepository
+from utils.write_queue import GroupCommitWriter
+
+
+def create_store(backend: str):
+    directory = tempfile.mkdtemp(prefix="citizen-ai-bench-")
+    if backend == "sqlite-normal":
+        return SqliteFeedbackRepository(os.path.join(directory, "feedback.db"), synchronous="NORMAL")
+    if backend == "sqlite-full":
+        return SqliteFeedbackRepository(os.path.join(directory, "feedback.db"), synchronous="FULL")
+    if backend == "log":
+        return FeedbackLog(os.path.join(directory, "feedback_log"), fsync=False)
+    if backend == "log-fsync":
+        return FeedbackLog(os.path.join(directory, "feedback_log"), fsync=True)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def make_record(writer: int, index: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "text": f"writer {writer} record {index}: the bus was late again",
+        "category": "Transport",
+        "user_id": None,
+        "sentiment": "negative",
+        "score": -0.3,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+async def stress(store, strategy: str, writers: int, records: int):
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=writers)
+    group_writer = GroupCommitWriter(store) if strategy == "group" else None
+    acknowledged, latencies = [], []
+
+    async def writer(number: int):
+        for index in range(records):
+            record = make_record(number, index)
+            t0 = time.perf_counter()
+            if group_writer is not None:
+                await group_writer.write(record)
+            else:
+                await loop.run_in_executor(pool, store.append, record)
+            latencies.append(time.perf_counter() - t0)
+            acknowledged.append(record["id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(n) for n in range(writers)))
+    elapsed = time.perf_counter() - start
+    if group_writer is not None:
+        group_writer.shutdown()
+    pool.shutdown()
+
+    stored = [record["id"] for record in store.iter_records()]
+    missing = set(acknowledged) - set(stored)
+    duplicates = len(stored) - len(set(stored))
+    result = summarize(latencies, elapsed)
+    result.update(missing=len(missing), duplicates=duplicates,
+                  mean_group=group_writer.stats()["mean_group_size"] if group_writer else 1.0)
+    return result
+
+
+async def http_stress(writers: int, records: int):
+    with ApiServer() as server:
+        limits = httpx.Limits(max_connections=writers)
+        async with httpx.AsyncClient(base_url=server.url, timeout=120, limits=limits) as client:
+            acknowledged = []
+
+            async def writer(number: int):
+                for index in range(records):
+                    response = await client.post("/feedback", json={"text": f"writer {number} record {index}: potholes"})
+                    if response.status_code == 200:
+                        acknowledged.append(response.json()["id"])
+
+            start = time.perf_counter()
+            await asyncio.gather(*(writer(n) for n in range(writers)))
+            elapsed = time.perf_counter() - start
+            stored = {record["id"] for record in (await client.get("/feedback")).json()}
+            summary_total = (await client.get("/sentiment/summary")).json()["total"]
+    print(f"HTTP: {len(acknowledged)} acknowledged in {elapsed:.1f}s "
+          f"({len(acknowledged) / elapsed:.0f}/s), missing from storage: {len(set(acknowledged) - stored)}, "
+          f"summary total: {summary_total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--records", type=int, default=50)
+    parser.add_argument("--backends", default="sqlite-normal,sqlite-full,log,log-fsync")
+    parser.add_argument("--http", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.records} records")
+    print(f"{'backend':<15}{'strategy':<10}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'group':>8}{'missing':>9}{'dupes':>7}")
+    for backend in args.backends.split(","):
+        for strategy in ("direct", "group"):
+            result = asyncio.run(stress(create_store(backend), strategy, args.writers, args.records))
+            print(f"{backend:<15}{strategy:<10}{result['throughput_per_s']:>10.0f}{result['p50_ms']:>9.2f}"
+                  f"{result['p99_ms']:>9.2f}{result['mean_group']:>8.1f}{result['missing']:>9}{result['duplicates']:>7}")
+    if args.http:
+        asyncio.run(http_stress(args.writers, args.records))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Benchmark suite for the API: HTTP load tests against real uvicorn servers
+plus in-process microbenchmarks, with results written as JSON and compared
+against a stored baseline.
+
+HTTP scenarios:
+    chat                 POST /chat against the fake Gemini server (answer cache off)
+    feedback_post.N      POST /feedback with distinct texts on a corpus of N records
+    feedback_page.N      GET /feedback?limit=50&order=desc
+    feedback_all.N       GET /feedback, the whole corpus (only up to --full-list-max)
+    sentiment_summary.N  GET /sentiment/summary
+    cold_start.import    `import app.main` in a fresh interpreter (see cold_start.py)
+    cold_start.first_response, cold_start.ready
+                         Spawning uvicorn until / answers and until /ready is 200
+                         (with a ".N" suffix on a corpus of N records, see --cold-start-sizes)
+Microbenchmarks:
+    analyze_sentiment, mock_response, topic_matcher,
+    near_duplicates (NearDuplicateIndex.assign, half of the texts near-copies)
+
+Every scenario reports throughput and p50/p95/p99 latency. With --baseline,
+scenarios whose throughput drops or whose p95 rises by more than --tolerance
+are listed as regressions and the exit code is 1.
+
+Usage:
+    python benchmarks/run.py [--sizes 1000,10000,100000,1000000] [--requests 300]
+        [--concurrency 16] [--llm-latency 0.2] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--tolerance 0.25] [--save-baseline]
+        [--only chat,feedback_post,...] [--cold-start-sizes 0,200000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+from cold_start import run_cold_start
+from common import (
+    REPO_ROOT, ApiServer, FakeGeminiServer, isolate_environment, random_text, seed_corpus, summarize
+)
+
+isolate_environment()
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+CORPUS_SCENARIOS = {"feedback_post", "feedback_page", "feedback_all", "sentiment_summary"}
+MICRO_SCENARIOS = {"analyze_sentiment", "mock_response", "topic_matcher", "near_duplicates"}
+
+CHAT_MESSAGES = ["How do I renew my permit?", "When is my property tax due?",
+                 "Which bus goes to the city hall?", "How can I report a pothole?",
+                 "Where do I register to vote?", "What are the library opening hours?"]
+
+
+async def load(url: str, request, requests: int, concurrency: int, timeout: float = 300) -> dict:
+    """Send `requests` requests from `concurrency` closed-loop clients and summarize their latencies."""
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            response = await request(client, i)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    result = summarize(latencies, elapsed)
+    result["errors"] = errors
+    return result
+
+
+def bench_chat(args) -> dict:
+    with FakeGeminiServer(latency=args.llm_latency) as gemini:
+        env = {**gemini.api_env(), "ANSWER_CACHE_SIZE": "0"}
+        with ApiServer(env=env) as server:
+            async def chat(client, i):
+                return await client.post("/chat", json={
+                    "message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)], "session_id": f"bench-{i}"
+                })
+            return {"chat": asyncio.run(load(server.url, chat, args.requests, args.concurrency))}
+
+
+def bench_corpus(size: int, args, only) -> dict:
+    results = {}
+    server = ApiServer(startup_timeout=1800)
+    started = time.perf_counter()
+    seed_corpus(server.env["CITIZEN_AI_DATA_DIR"], size)
+    print(f"  seeded {size} records in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    with server:
+        rng = random.Random(size)
+
+        async def post_feedback(client, i):
+            return await client.post("/feedback", json={"text": f"{random_text(rng)} {i}", "category": "Roads"})
+
+        async def get_page(client, i):
+            return await client.get("/feedback", params={"limit": 50, "order": "desc"})
+
+        async def get_all(client, i):
+            return await client.get("/feedback")
+
+        async def get_summary(client, i):
+            return await client.get("/sentiment/summary")
+
+        scenarios = [
+            ("feedback_post", post_feedback, args.requests, args.concurrency),
+            ("feedback_page", get_page, args.requests, args.concurrency),
+            ("sentiment_summary", get_summary, args.requests, args.concurrency),
+        ]
+        if size <= args.full_list_max:
+            scenarios.append(("feedback_all", get_all, args.full_list_requests, 1))
+        for name, request, requests, concurrency in scenarios:
+            if only and name not in only:
+                continue
+            results[f"{name}.{size}"] = asyncio.run(load(server.url, request, requests, concurrency))
+    return results
+
+
+def bench_micro(args, only) -> dict:
+    from utils.sentiment import analyze_sentiment
+    from utils.ai_response import get_mock_response, topic_matcher
+    from utils.near_duplicates import NearDuplicateIndex
+
+    rng = random.Random(11)
+    texts = [random_text(rng, rng.randint(5, 40)) for _ in range(args.micro_iterations)]
+    messages = [f"{random_text(rng, 6)} {rng.choice(CHAT_MESSAGES)}" for _ in range(args.micro_iterations)]
+    # Half of the feedback repeats an earlier text with a small edit, like a coordinated campaign
+    feedback = [text if i % 2 == 0 else f"{texts[i - 1]} {i}" for i, text in enumerate(texts)]
+    near_duplicates = NearDuplicateIndex()
+    functions = {
+        "analyze_sentiment": (analyze_sentiment, texts),
+        "mock_response": (get_mock_response, messages),
+        "topic_matcher": (topic_matcher.best, messages),
+        "near_duplicates": (lambda text: near_duplicates.assign(uuid.uuid4().hex, text), feedback),
+    }
+    results = {}
+    for name, (function, inputs) in functions.items():
+        if only and name not in only:
+            continue
+        function(inputs[0])
+        latencies = []
+        start = time.perf_counter()
+        for value in inputs:
+            t0 = time.perf_counter()
+            function(value)
+            latencies.append(time.perf_counter() - t0)
+        results[f"micro.{name}"] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a description of every scenario that regressed beyond `tolerance`."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["throughput_per_s"] < previous["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_per_s']:.1f} -> {current['throughput_per_s']:.1f}/s")
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--full-list-max", type=int, default=100000)
+    parser.add_argument("--full-list-requests", type=int, default=5)
+    parser.add_argument("--micro-iterations", type=int, default=5000)
+    parser.add_argument("--cold-start-runs", type=int, default=5)
+    parser.add_argument("--cold-start-sizes", default="0", help="Corpus sizes for the cold start (0 is an empty corpus)")
+    parser.add_argument("--only", default="", help="Comma-separated scenario names to run")
+    parser.add_argument("--output", default="", help="Write the results JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+    only = {name for name in args.only.split(",") if name}
+
+    results = {}
+    if not only or "chat" in only:
+        print("chat", file=sys.stderr)
+        results.update(bench_chat(args))
+    if not only or only & CORPUS_SCENARIOS:
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            print(f"corpus {size}", file=sys.stderr)
+            results.update(bench_corpus(size, args, only))
+    if not only or only & MICRO_SCENARIOS:
+        print("microbenchmarks", file=sys.stderr)
+        results.update(bench_micro(args, only))
+    if not only or "cold_start" in only:
+        print("cold start", file=sys.stderr)
+        results.update(run_cold_start(args.cold_start_runs,
+                                      [int(s) for s in args.cold_start_sizes.split(",") if s]))
+
+    print(f"{'scenario':<32}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<32}{result['throughput_per_s']:>10.1f}{result['p50_ms']:>10.2f}"
+              f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "save_baseline")}
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare the sentiment engines (combined, vader, fast) on the reference corpus
+in benchmarks/sentiment_reference.txt: how often each one gives the same
+positive/neutral/negative label as the combined engine, and how many texts
+per second each one scores through analyze_sentiment_batch.
+
+Usage:
+    python benchmarks/sentiment_engines.py [--texts 20000] [--batch-size 256] [--disagreements]
+"""
+import argparse
+import os
+import random
+import time
+
+from common import REPO_ROOT, isolate_environment
+
+isolate_environment()
+
+from utils.sentiment import ENGINES, analyze_sentiment_batch  # noqa: E402
+
+REFERENCE_CORPUS = os.path.join(REPO_ROOT, "benchmarks", "sentiment_reference.txt")
+
+
+def load_reference() -> list:
+    with open(REFERENCE_CORPUS, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def agreement(reference: list) -> dict:
+    """Per engine, the labels it gives and the share matching the combined engine."""
+    labels = {engine: [r["sentiment"] for r in analyze_sentiment_batch(reference, engine)] for engine in ENGINES}
+    baseline = labels["combined"]
+    return {engine: (sum(a == b for a, b in zip(engine_labels, baseline)) / len(baseline), engine_labels)
+            for engine, engine_labels in labels.items()}
+
+
+def throughput(engine: str, texts: list, batch_size: int) -> float:
+    analyze_sentiment_batch(texts[:batch_size], engine)
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        analyze_sentiment_batch(texts[i:i + batch_size], engine)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20000, help="Texts scored per engine for the throughput")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--disagreements", action="store_true", help="List texts where fast and combined differ")
+    args = parser.parse_args()
+
+    reference = load_reference()
+    rng = random.Random(7)
+    texts = [rng.choice(reference) for _ in range(args.texts)]
+
+    results = agreement(reference)
+    print(f"{len(reference)} reference texts, {args.texts} texts in batches of {args.batch_size}")
+    print(f"{'engine':<10}{'agreement':>12}{'texts/s':>12}")
+    for engine in ENGINES:
+        print(f"{engine:<10}{results[engine][0]:>11.1%}{throughput(engine, texts, args.batch_size):>12.0f}")
+
+    if args.disagreements:
+        print()
+        for text, fast, combined in zip(reference, results["fast"][1], results["combined"][1]):
+            if fast != combined:
+                print(f"  fast={fast:<9} combined={combined:<9} {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmark of the mock responder's topic routing: the compiled
+TopicMatcher against the previous per-list substring scans.
+
+Usage:
+    python benchmarks/topic_router.py [--messages 100000] [--seed 7]
+"""
+import argparse
+import random
+import time
+
+from common import isolate_environment
+
+isolate_environment()
+
+from utils.ai_response import TOPIC_KEYWORDS, GREETING_KEYWORDS, HELP_KEYWORDS, topic_matcher
+
+FILLER = ["the", "my", "is", "when", "where", "can", "this", "please", "about", "city", "office",
+          "need", "information", "today", "should", "which", "department", "form", "online", "thing"]
+
+
+def legacy_route(message: str):
+    # The routing loop used before TopicMatcher: first substring match wins
+    message_lower = message.lower()
+    if any(word in message_lower for word in GREETING_KEYWORDS):
+        return "greeting"
+    if any(word in message_lower for word in HELP_KEYWORDS):
+        return "help"
+    for domain, keywords in TOPIC_KEYWORDS.items():
+        if any(keyword in message_lower for keyword in keywords):
+            return domain
+    return None
+
+
+def legacy_all_topics(message: str):
+    # The previous substring scans extended to report every matching topic,
+    # which is what TopicMatcher.scores computes
+    message_lower = message.lower()
+    matched = {}
+    for topic, keywords in [("greeting", GREETING_KEYWORDS), ("help", HELP_KEYWORDS), *TOPIC_KEYWORDS.items()]:
+        hits = sum(1 for keyword in keywords if keyword in message_lower)
+        if hits:
+            matched[topic] = hits
+    return matched
+
+
+def build_corpus(size: int, seed: int):
+    rng = random.Random(seed)
+    keywords = [k for ks in TOPIC_KEYWORDS.values() for k in ks] + GREETING_KEYWORDS + HELP_KEYWORDS
+    corpus = []
+    for _ in range(size):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(6, 30))]
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        corpus.append(" ".join(words).capitalize() + "?")
+    return corpus
+
+
+def time_router(route, corpus):
+    start = time.perf_counter()
+    results = [route(message) for message in corpus]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    legacy_time, legacy_results = time_router(legacy_route, corpus)
+    compiled_time, compiled_results = time_router(topic_matcher.best, corpus)
+    legacy_all_time, _ = time_router(legacy_all_topics, corpus)
+    scores_time, _ = time_router(topic_matcher.scores, corpus)
+
+    false_greetings = sum(1 for m, r in zip(corpus, legacy_results)
+                          if r == "greeting" and "greeting" not in topic_matcher.scores(m))
+    print(f"messages:              {len(corpus)}")
+    print("first match only (legacy routing, which exits early on false matches):")
+    print(f"  legacy loop:         {legacy_time / len(corpus) * 1e6:8.2f} us/message")
+    print(f"  compiled best():     {compiled_time / len(corpus) * 1e6:8.2f} us/message")
+    print("all matched topics with scores:")
+    print(f"  legacy scans:        {legacy_all_time / len(corpus) * 1e6:8.2f} us/message")
+    print(f"  compiled scores():   {scores_time / len(corpus) * 1e6:8.2f} us/message")
+    print(f"  speedup:             {legacy_all_time / scores_time:8.2f}x")
+    print(f"same route:            {sum(a == b for a, b in zip(legacy_results, compiled_results)) / len(corpus):8.1%}")
+    print(f"legacy false greetings (substring matches such as 'hi' in 'this'): {false_greetings}")
+
+
+if __name__ == "__main__":
+    main()
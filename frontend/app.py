@@ -15,6 +15,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Constants
 API_URL = "http://localhost:8000"
+DASHBOARD_CACHE_TTL = 15  # seconds before the dashboard revalidates with the API
 
 # Page configuration
 st.set_page_config(
@@ -34,27 +35,68 @@ if "session_id" not in st.session_state:
 if "feedback_submitted" not in st.session_state:
     st.session_state.feedback_submitted = False
 
+# Pooled HTTP session shared by all reruns, so connections are reused
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Last ETag and payload per request, shared across reruns for revalidation
+@st.cache_resource
+def get_etag_cache() -> Dict[int, Any]:
+    return {}
+
+http = get_http_session()
+
 # Functions to interact with the API
-def get_ai_response(message: str) -> str:
+def chat_payload(message: str, resync: bool = False) -> Dict[str, Any]:
+    # The server keeps the conversation; normally only the new message and the
+    # number of earlier messages are sent. On a resync the full history is sent.
+    history = [m for m in st.session_state.messages[:-1] if "content" in m]
+    payload = {
+        "message": message,
+        "session_id": st.session_state.session_id,
+        "seq": len(history)
+    }
+    if resync:
+        payload["context"] = history
+    return payload
+
+def chat_headers() -> Dict[str, str]:
+    # Rate limits apply per browser session when the API lists this server in CHAT_TRUSTED_PROXIES
+    return {"X-Client-Id": st.session_state.session_id}
+
+def stream_ai_response(message: str):
+    # Yields response pieces from the Server-Sent Events of /chat/stream
     try:
-        response = requests.post(
-            f"{API_URL}/chat",
-            json={
-                "message": message,
-                "session_id": st.session_state.session_id,
-                "context": [m for m in st.session_state.messages if "content" in m]
-            }
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("response", "Sorry, I couldn't process your request.")
+        response = http.post(f"{API_URL}/chat/stream", json=chat_payload(message), headers=chat_headers(), stream=True)
+        if response.status_code == 409:
+            # The server's history diverged from ours (e.g. it restarted); resend it
+            response.close()
+            response = http.post(f"{API_URL}/chat/stream", json=chat_payload(message, resync=True),
+                                 headers=chat_headers(), stream=True)
+        with response:
+            response.raise_for_status()
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "token":
+                        yield data["token"]
+                    elif event == "error":
+                        raise RuntimeError(data.get("detail", "Streaming failed"))
     except Exception as e:
         st.error(f"Error communicating with AI service: {str(e)}")
-        return "Sorry, I'm having trouble connecting to the server right now."
+        yield "Sorry, I'm having trouble connecting to the server right now."
 
 def submit_feedback(text: str, category: str = None) -> Dict[str, Any]:
     try:
-        response = requests.post(
+        response = http.post(
             f"{API_URL}/feedback",
             json={"text": text, "category": category}
         )
@@ -64,23 +106,26 @@ def submit_feedback(text: str, category: str = None) -> Dict[str, Any]:
         st.error(f"Error submitting feedback: {str(e)}")
         return {}
 
-def get_all_feedback() -> List[Dict[str, Any]]:
-    try:
-        response = requests.get(f"{API_URL}/feedback")
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"Error fetching feedback data: {str(e)}")
-        return []
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL, show_spinner=False)
+def fetch_dashboard_aggregates(recent: int = 5) -> Dict[str, Any]:
+    # Revalidates with If-None-Match; a 304 reuses the previous payload
+    etag_cache = get_etag_cache()
+    cached = etag_cache.get(recent)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = http.get(f"{API_URL}/dashboard/aggregates", params={"recent": recent}, headers=headers, timeout=10)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    response.raise_for_status()
+    data = response.json()
+    etag_cache[recent] = (response.headers.get("ETag"), data)
+    return data
 
-def get_sentiment_summary() -> Dict[str, int]:
+def get_dashboard_aggregates(recent: int = 5) -> Dict[str, Any]:
     try:
-        response = requests.get(f"{API_URL}/sentiment/summary")
-        response.raise_for_status()
-        return response.json()
+        return fetch_dashboard_aggregates(recent)
     except Exception as e:
-        st.error(f"Error fetching sentiment summary: {str(e)}")
-        return {"positive": 0, "neutral": 0, "negative": 0, "total": 0}
+        st.error(f"Error fetching dashboard data: {str(e)}")
+        return {"sentiment_counts": {}, "total": 0, "daily": [], "categories": {}, "recent": []}
 
 # Sidebar navigation
 st.sidebar.title("Citizen AI Platform")
@@ -103,11 +148,9 @@ if page == "Chat Assistant":
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Get AI response
+        # Get AI response, rendering tokens as they arrive
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = get_ai_response(prompt)
-                st.write(response)
+            response = st.write_stream(stream_ai_response(prompt))
         
         # Add assistant response to chat history
         st.session_state.messages.append({"role": "assistant", "content": response})
@@ -145,19 +188,13 @@ elif page == "Dashboard":
     st.header("📊 Citizen Feedback Dashboard")
     st.markdown("Visualizing citizen sentiment and feedback trends.")
     
-    # Get data
-    feedback_data = get_all_feedback()
-    sentiment_summary = get_sentiment_summary()
+    # Get precomputed aggregates; cost does not depend on the number of feedback items
+    aggregates = get_dashboard_aggregates(recent=5)
+    sentiment_summary = aggregates["sentiment_counts"]
     
-    if not feedback_data:
+    if not aggregates["total"]:
         st.info("No feedback data available yet. Submit some feedback to see the dashboard.")
     else:
-        # Convert to DataFrame
-        df = pd.DataFrame(feedback_data)
-        
-        # Add date column from timestamp
-        df['date'] = pd.to_datetime(df['timestamp']).dt.date
-        
         # Dashboard layout with columns
         col1, col2 = st.columns(2)
         
@@ -189,7 +226,7 @@ elif page == "Dashboard":
             st.pyplot(fig)
             
             # Display counts
-            st.markdown(f"**Total Feedback:** {sentiment_summary.get('total', 0)}")
+            st.markdown(f"**Total Feedback:** {aggregates['total']}")
             st.markdown(f"**Positive:** {sentiment_summary.get('positive', 0)}")
             st.markdown(f"**Neutral:** {sentiment_summary.get('neutral', 0)}")
             st.markdown(f"**Negative:** {sentiment_summary.get('negative', 0)}")
@@ -197,17 +234,10 @@ elif page == "Dashboard":
         with col2:
             st.subheader("Sentiment Trends Over Time")
             
-            # Group by date and sentiment, count occurrences
-            if len(df) > 0 and 'date' in df.columns and 'sentiment' in df.columns:
-                sentiment_by_date = df.groupby(['date', 'sentiment']).size().reset_index(name='count')
-                
-                # Pivot the data for plotting
-                pivot_data = sentiment_by_date.pivot(index='date', columns='sentiment', values='count').fillna(0)
-                
-                # Ensure all sentiments are represented
-                for sentiment in ['positive', 'neutral', 'negative']:
-                    if sentiment not in pivot_data.columns:
-                        pivot_data[sentiment] = 0
+            # The daily pivot comes precomputed: one row per day
+            if aggregates["daily"]:
+                pivot_data = pd.DataFrame(aggregates["daily"]).set_index("bucket")[['positive', 'neutral', 'negative']]
+                pivot_data.index = pd.to_datetime(pivot_data.index).date
                 
                 # Plot the data
                 fig, ax = plt.subplots(figsize=(10, 6))
@@ -225,8 +255,8 @@ elif page == "Dashboard":
         
         # Category distribution
         st.subheader("Feedback by Category")
-        if 'category' in df.columns:
-            category_counts = df['category'].value_counts()
+        if aggregates["categories"]:
+            category_counts = pd.Series(aggregates["categories"]).sort_values(ascending=False)
             
             fig, ax = plt.subplots(figsize=(10, 6))
             sns.barplot(x=category_counts.index, y=category_counts.values, palette='viridis')
@@ -240,16 +270,14 @@ elif page == "Dashboard":
         
         # Recent feedback
         st.subheader("Recent Feedback")
-        if not df.empty:
-            recent_df = df.sort_values('timestamp', ascending=False).head(5)
-            for _, row in recent_df.iterrows():
-                sentiment_color = "#28a745" if row['sentiment'] == "positive" else "#ffc107" if row['sentiment'] == "neutral" else "#dc3545"
-                st.markdown(f"<div style='padding: 10px; margin-bottom: 10px; border-left: 5px solid {sentiment_color}; background-color: #f8f9fa;'>"
-                          f"<strong>Category:</strong> {row['category']}<br>"
-                          f"<strong>Sentiment:</strong> {row['sentiment'].title()}<br>"
-                          f"<strong>Feedback:</strong> {row['text']}<br>"
-                          f"<small>Submitted on {row['timestamp'][:10]}</small>"
-                          f"</div>", unsafe_allow_html=True)
+        for row in aggregates["recent"]:
+            sentiment_color = "#28a745" if row['sentiment'] == "positive" else "#ffc107" if row['sentiment'] == "neutral" else "#dc3545"
+            st.markdown(f"<div style='padding: 10px; margin-bottom: 10px; border-left: 5px solid {sentiment_color}; background-color: #f8f9fa;'>"
+                      f"<strong>Category:</strong> {row['category']}<br>"
+                      f"<strong>Sentiment:</strong> {row['sentiment'].title()}<br>"
+                      f"<strong>Feedback:</strong> {row['text']}<br>"
+                      f"<small>Submitted on {row['timestamp'][:10]}</small>"
+                      f"</div>", unsafe_allow_html=True)
 
 # Footer
 st.sidebar.markdown("---")
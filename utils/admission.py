@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; `reason` is "queue_full" or "slo"."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request not admitted: {reason}")
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Bounds the work in flight behind a slow upstream and sheds what cannot be
+    served within a latency objective.
+
+    Up to `max_concurrency` requests hold a slot at once; the next ones wait
+    in a FIFO queue of at most `max_queue` requests. A request is rejected at
+    once when the queue is full or when its expected wait (its place in the
+    queue times the average slot hold time, spread over the slots) exceeds
+    `slo`, and after waiting `slo` seconds without getting a slot. Callers
+    answer rejected requests some cheaper way instead of failing them.
+
+    Args:
+        max_concurrency: Requests holding a slot at once
+        max_queue: Requests waiting for a slot at once
+        slo: Longest queueing delay in seconds worth waiting for
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, slo: float = 1.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.slo = slo
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        # Moving average of how long a slot is held, for the expected wait
+        self._hold_time: Optional[float] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {"queue_full": 0, "slo": 0}
+
+    def expected_wait(self) -> float:
+        """Seconds a request arriving now is expected to wait for a slot."""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            return 0.0
+        return (len(self._waiters) + 1) * (self._hold_time or 0.0) / self.max_concurrency
+
+    async def _acquire(self) -> float:
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected("queue_full")
+        if self.expected_wait() > self.slo:
+            raise AdmissionRejected("slo")
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.slo)
+        except BaseException:
+            # Cancelled while waiting; pass on a slot that was handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            # The slot is handed over by setting the result; anything else means no slot
+            if not waiter.done() or waiter.cancelled():
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        if waiter.cancelled():
+            raise AdmissionRejected("slo")
+        return time.perf_counter() - started
+
+    def _release(self, held: Optional[float] = None):
+        if held is not None:
+            self._hold_time = held if self._hold_time is None else 0.8 * self._hold_time + 0.2 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the longest waiting request
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold a slot for the duration of the block.
+
+        Yields:
+            Seconds spent waiting in the queue
+
+        Raises:
+            AdmissionRejected: If no slot can be had within the objective
+        """
+        try:
+            waited = await self._acquire()
+        except AdmissionRejected as e:
+            self.rejected[e.reason] += 1
+            raise
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self._release(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "slo": self.slo,
+            "expected_wait": self.expected_wait(),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected)
+        }
+
+
+class ClientRateLimiter:
+    """
+    Token bucket per client: each client may make `burst` requests at once
+    and `rate` per second on average. Buckets of the least recently seen
+    clients are dropped beyond `max_clients`, which only ever forgives them.
+
+    Args:
+        rate: Tokens added per second (0 disables the limit)
+        burst: Bucket capacity
+        max_clients: Buckets kept
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 20, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> [tokens, time of last refill], least recently seen first
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, client: str, now: Optional[float] = None) -> float:
+        """
+        Take a token for `client`. Returns 0 when the request may proceed,
+        otherwise the seconds until a token is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [float(self.burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            self.limited += 1
+            return (1.0 - bucket[0]) / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets), "limited": self.limited}
@@ -0,0 +1,178 @@
+import math
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+UNCATEGORIZED = "Uncategorized"
+# Scorer version reported for records stored before versions were recorded
+UNVERSIONED = "unversioned"
+
+
+class _Distribution:
+    """Counts by sentiment and by category plus score moments for one set of records."""
+
+    def __init__(self):
+        self.total = 0
+        self.sentiments = {label: 0 for label in SENTIMENT_LABELS}
+        self.categories: Dict[str, int] = {}
+        self.score_count = 0
+        self.score_sum = 0.0
+        self.score_sum_sq = 0.0
+
+    def add(self, sentiment: str, category: str, score: Optional[float]):
+        self.total += 1
+        if sentiment in self.sentiments:
+            self.sentiments[sentiment] += 1
+        self.categories[category] = self.categories.get(category, 0) + 1
+        if score is not None:
+            self.score_count += 1
+            self.score_sum += score
+            self.score_sum_sq += score * score
+
+    def summary(self) -> Dict[str, Any]:
+        mean = self.score_sum / self.score_count if self.score_count else 0.0
+        variance = self.score_sum_sq / self.score_count - mean * mean if self.score_count else 0.0
+        return {
+            **self.sentiments,
+            "total": self.total,
+            "categories": dict(self.categories),
+            "mean_score": mean,
+            "score_stddev": math.sqrt(max(variance, 0.0))
+        }
+
+
+class SentimentAggregates:
+    """
+    Running sentiment statistics, updated as each feedback record is written.
+
+    Keeps counts by sentiment, by category, by scorer version and by day/hour
+    bucket plus the sum and sum of squares of the score, so the summary can be served without
+    touching storage. The counts and scores are also kept for the first
+    record of each near-duplicate cluster only, to summarize with every
+    cluster counted once. Rebuild from storage once at startup with `rebuild`.
+    `version` increases on every change and can be used to validate caches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # Records added while a rebuild streams storage, or None when none runs
+        self._pending: Optional[List[Dict[str, Any]]] = None
+        self.version = 0
+        self._reset()
+
+    def _reset(self):
+        self.records = _Distribution()
+        # Records without a cluster id, or that started their cluster
+        self.clusters = _Distribution()
+        self.scorer_versions: Dict[str, int] = {}
+        self.buckets: Dict[str, Dict[str, Dict[str, int]]] = {"day": {}, "hour": {}}
+
+    @property
+    def total(self) -> int:
+        return self.records.total
+
+    @staticmethod
+    def _bucket_keys(timestamp: str) -> Dict[str, str]:
+        # ISO timestamps: "YYYY-MM-DD" is the day, "YYYY-MM-DDTHH" the hour
+        return {"day": timestamp[:10], "hour": timestamp[:13]}
+
+    def _add(self, record: Dict[str, Any]):
+        sentiment = (record.get("sentiment") or "neutral").lower()
+        category = record.get("category") or UNCATEGORIZED
+
+        score = record.get("score")
+        self.records.add(sentiment, category, score)
+        if record.get("cluster_id") in (None, record.get("id")):
+            self.clusters.add(sentiment, category, score)
+        version = record.get("scorer_version") or UNVERSIONED
+        self.scorer_versions[version] = self.scorer_versions.get(version, 0) + 1
+
+        timestamp = record.get("timestamp")
+        if timestamp:
+            for granularity, key in self._bucket_keys(timestamp).items():
+                bucket = self.buckets[granularity].get(key)
+                if bucket is None:
+                    bucket = self.buckets[granularity][key] = {label: 0 for label in SENTIMENT_LABELS}
+                    bucket["total"] = 0
+                bucket["total"] += 1
+                if sentiment in bucket:
+                    bucket[sentiment] += 1
+
+    def add(self, record: Dict[str, Any]):
+        """Fold a newly stored record into the aggregates."""
+        with self._lock:
+            self._add(record)
+            if self._pending is not None:
+                self._pending.append(record)
+            self.version += 1
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]):
+        """
+        Recompute the aggregates from scratch by streaming `records`.
+
+        The new counts are built aside while the current ones keep serving
+        and being updated, then swapped in. Records added meanwhile are
+        folded in unless the stream already held them (matched by id), so
+        a write racing the rebuild is counted exactly once.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            fresh = SentimentAggregates()
+            seen = set()
+            try:
+                for record in records:
+                    fresh._add(record)
+                    seen.add(record.get("id"))
+                with self._lock:
+                    for record in self._pending:
+                        if record.get("id") not in seen:
+                            fresh._add(record)
+                    self.records, self.clusters = fresh.records, fresh.clusters
+                    self.scorer_versions, self.buckets = fresh.scorer_versions, fresh.buckets
+                    self.version += 1
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def summary(self, dedupe: bool = False) -> Dict[str, Any]:
+        """
+        Return sentiment counts, category counts and score statistics. More
+        than one entry in "scorer_versions" means the stored scores mix
+        scorer configurations.
+
+        Args:
+            dedupe: Count each near-duplicate cluster once, by its first record
+        """
+        with self._lock:
+            summary = (self.clusters if dedupe else self.records).summary()
+            summary["scorer_versions"] = dict(self.scorer_versions)
+            summary["near_duplicates"] = self.records.total - self.clusters.total
+            return summary
+
+    def timeseries(self, granularity: str = "day", start: Optional[str] = None,
+                   end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Return per-bucket sentiment counts in chronological order.
+
+        Args:
+            granularity: "day" or "hour"
+            start: Inclusive lower bound on the bucket key (ISO prefix)
+            end: Exclusive upper bound on the bucket key (ISO prefix)
+
+        Returns:
+            List of {"bucket", "positive", "neutral", "negative", "total"}
+        """
+        if granularity not in self.buckets:
+            raise ValueError("granularity must be 'day' or 'hour'")
+        with self._lock:
+            items = list(self.buckets[granularity].items())
+        series = []
+        for key, counts in sorted(items):
+            if start is not None and key < start[:len(key)]:
+                continue
+            if end is not None and key >= end[:len(key)]:
+                continue
+            series.append({"bucket": key, **counts})
+        return series
@@ -1,17 +1,41 @@
 import random
 import json
 import os
-from typing import List, Dict, Any, Optional
-import google.generativeai as genai
+import asyncio
+from contextlib import aclosing, asynccontextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from dotenv import load_dotenv
+from utils.session_store import SessionBackend, SessionStore, SqliteSessionStore, SessionOutOfSyncError
+from utils.llm_client import GeminiClient
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.topic_matcher import TopicMatcher
+from utils.answer_cache import AnswerCache
+from utils.metrics import registry, span
 
 # Load environment variables
 load_dotenv()
 
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+llm_client = None
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    llm_client = GeminiClient(
+        api_key=GEMINI_API_KEY,
+        model_name=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 16)),
+        timeout=float(os.getenv("LLM_TIMEOUT", 20.0)),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", 2)),
+        api_endpoint=os.getenv("GEMINI_API_ENDPOINT")
+    )
+
+# Bound the chat requests waiting on Gemini; those that would wait longer than
+# CHAT_QUEUE_SLO seconds are answered from the local responses instead
+CHAT_ADMISSION_CONTROL = os.getenv("CHAT_ADMISSION_CONTROL", "true").lower() == "true"
+chat_admission = AdmissionController(
+    max_concurrency=int(os.getenv("CHAT_MAX_CONCURRENCY") or os.getenv("LLM_MAX_CONCURRENCY") or 16),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", 64)),
+    slo=float(os.getenv("CHAT_QUEUE_SLO", 1.0))
+)
 
 # Mock responses for different categories (used as fallback when API is not available)
 MOCK_RESPONSES = {
@@ -49,6 +73,15 @@ TOPIC_KEYWORDS = {
     "public_safety": ["police", "fire", "emergency", "safety", "crime", "report", "security", "protection"]
 }
 
+# Keywords for greetings and help requests
+GREETING_KEYWORDS = ["hello", "hi", "hey", "greetings"]
+HELP_KEYWORDS = ["help", "assist", "support", "guide"]
+
+# Compiled once; on equal scores a domain topic wins over help, and help over a greeting.
+# Only domain keywords match in plural form ("hi" would otherwise match "his").
+topic_matcher = TopicMatcher({**TOPIC_KEYWORDS, "help": HELP_KEYWORDS, "greeting": GREETING_KEYWORDS},
+                             plural_topics=TOPIC_KEYWORDS)
+
 # Domain-specific responses
 DOMAIN_RESPONSES = {
     "transportation": [
@@ -93,87 +126,299 @@ DOMAIN_RESPONSES = {
     ]
 }
 
-# Context tracking
-context_store = {}
+# Cache of upstream answers to first-turn questions, with a paraphrase tier
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", 5000)),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.85))
+)
+
+# Context tracking: bounded per-session conversation histories, either in
+# this process ("memory") or shared by all workers on the host ("sqlite")
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+
+def create_session_store(backend: str) -> SessionBackend:
+    limits = dict(
+        ttl=float(os.getenv("SESSION_TTL", 1800)),
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", 10000)),
+        max_total_bytes=int(os.getenv("SESSION_MAX_TOTAL_BYTES", 64 * 1024 * 1024)),
+        max_turns=int(os.getenv("SESSION_MAX_TURNS", 40)),
+        max_session_bytes=int(os.getenv("SESSION_MAX_BYTES", 64 * 1024)),
+        truncation=os.getenv("SESSION_TRUNCATION", "window").lower()
+    )
+    if backend == "memory":
+        return SessionStore(**limits)
+    if backend == "sqlite":
+        path = os.getenv("SESSION_DB_PATH") or os.path.join(
+            os.getenv("CITIZEN_AI_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"),
+            "sessions.db"
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SqliteSessionStore(path, **limits)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+session_store = create_session_store(SESSION_BACKEND)
+
+async def session_call(func, *args):
+    """
+    Call a method of the session store from a coroutine. The SQLite backend
+    blocks on disk I/O, lock waits and conflict backoff, so its calls run in
+    a worker thread; the in-memory backend is called directly.
+    """
+    if session_store.blocking_io:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+def get_mock_response(message: str) -> str:
+    """
+    Pick a canned response for the message based on keywords.
+    Used when the Gemini API is not configured or fails.
+    
+    Args:
+        message: The user's message
+        
+    Returns:
+        Mock response text
+    """
+    # Route on the best-scoring topic in a single pass over the message
+    topic = topic_matcher.best(message)
+    
+    if topic in ("greeting", "help"):
+        return random.choice(MOCK_RESPONSES[topic])
+    
+    if topic:
+        return random.choice(DOMAIN_RESPONSES[topic])
+    
+    # Use general or fallback response
+    return random.choice(MOCK_RESPONSES["general_info"] if random.random() > 0.3 else MOCK_RESPONSES["fallback"])
+
+async def _cache_topic(message: str, session_id: str, context: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    # Only first turns are answered from the cache: later answers depend on the conversation
+    if not llm_client or context or await session_call(session_store.get, session_id):
+        return None
+    return topic_matcher.best(message) or "general"
 
-async def get_ai_response(message: str, session_id: Optional[str] = None, context: Optional[List[Dict[str, Any]]] = None) -> str:
+async def _start_turn(message: str, session_id: str, context: Optional[List[Dict[str, Any]]],
+                      seq: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Record the user's message and return the history in Gemini's format.
+    # The store keeps the history within its limits. A delta turn is appended
+    # only if the session is still at `seq`, so two turns sent with the same
+    # seq cannot both be interleaved into one history.
+    user_message = {"role": "user", "content": message}
+    if context:
+        # Full resync: the client's history replaces the server's
+        history = await session_call(session_store.set, session_id, list(context) + [user_message])
+    else:
+        history = await session_call(session_store.append, session_id, user_message, seq)
+    
+    formatted_history = []
+    for msg in history:
+        role = "user" if msg["role"] == "user" else "model"
+        formatted_history.append({"role": role, "parts": [msg["content"]]})
+    return formatted_history
+
+# Where each chat answer came from: "cache", "llm", "fallback", "degraded" (shed by
+# admission control) or "interrupted" (stream cut short)
+chat_responses = registry.counter("citizen_ai_chat_responses_total", "Chat responses by source", ("source",))
+llm_errors = registry.counter("citizen_ai_llm_errors_total", "Failed Gemini API calls by error type", ("error",))
+chat_admissions = registry.counter("citizen_ai_chat_admission_total",
+                                   "Chat requests admitted to Gemini or shed, by decision", ("decision",))
+chat_queue_seconds = registry.histogram("citizen_ai_chat_queue_seconds", "Time chat requests waited for a Gemini slot")
+
+@asynccontextmanager
+async def _gemini_slot():
+    # Hold a slot of the admission controller around a Gemini call; raises AdmissionRejected when shed
+    if not CHAT_ADMISSION_CONTROL:
+        yield
+        return
+    try:
+        async with chat_admission.slot() as waited:
+            chat_admissions.inc("admitted")
+            chat_queue_seconds.observe(waited)
+            yield
+    except AdmissionRejected as e:
+        chat_admissions.inc(e.reason)
+        raise
+
+async def _generate(formatted_history: List[Dict[str, Any]], message: str) -> str:
+    async with _gemini_slot():
+        return await llm_client.generate(formatted_history, message)
+
+async def get_ai_response_with_source(message: str, session_id: Optional[str] = None,
+                                      context: Optional[List[Dict[str, Any]]] = None,
+                                      seq: Optional[int] = None) -> Tuple[str, str]:
     """
     Generate an AI response to the user's message using Gemini Flash 1.5 model.
-    Falls back to mock responses if the API is not available.
+    Falls back to mock responses if the API is not available, and answers with
+    them right away when Gemini is too busy to answer within the queueing SLO.
     
     Args:
         message: The user's message
         session_id: Unique identifier for the conversation session
         context: Previous messages in the conversation
+        seq: Number of messages the client holds, for a delta request
         
     Returns:
-        AI-generated response
+        AI-generated response and where it came from: "cache", "llm",
+        "fallback" or "degraded"
     """
     # Initialize or retrieve context for this session
     if not session_id:
         session_id = "default"
     
-    if session_id not in context_store:
-        context_store[session_id] = []
+    cache_topic = await _cache_topic(message, session_id, context)
+    formatted_history = await _start_turn(message, session_id, context, seq)
     
-    # Add current message to context
-    if context:
-        context_store[session_id] = context
-    context_store[session_id].append({"role": "user", "content": message})
+    # Serve repeated first-turn questions without an upstream call
+    if cache_topic:
+        with span("chat.cache_lookup"):
+            cached = answer_cache.lookup(message, cache_topic)
+        if cached is not None:
+            await session_call(session_store.append, session_id, {"role": "assistant", "content": cached})
+            chat_responses.inc("cache")
+            return cached, "cache"
     
+    source = "fallback"
     # Try to use Gemini API if available
-    if GEMINI_API_KEY:
+    if llm_client:
         try:
-            # Format conversation history for Gemini
-            formatted_history = []
-            for msg in context_store[session_id]:
-                role = "user" if msg["role"] == "user" else "model"
-                formatted_history.append({"role": role, "parts": [msg["content"]]})
-            
-            # Initialize Gemini model
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            
-            # Generate response
-            chat = model.start_chat(history=formatted_history[:-1] if len(formatted_history) > 1 else [])
-            response = chat.send_message(message)
-            ai_response = response.text
+            # Generate response; times out into the mock responses below
+            with span("chat.llm"):
+                ai_response = await _generate(formatted_history[:-1], message)
+            if cache_topic:
+                answer_cache.store(message, cache_topic, ai_response)
             
             # Add response to context
-            context_store[session_id].append({"role": "assistant", "content": ai_response})
-            return ai_response
+            await session_call(session_store.append, session_id, {"role": "assistant", "content": ai_response})
+            chat_responses.inc("llm")
+            return ai_response, "llm"
             
+        except AdmissionRejected:
+            # Overloaded: a local answer now beats a better one too late
+            source = "degraded"
         except Exception as e:
             print(f"Error using Gemini API: {str(e)}")
+            llm_errors.inc(type(e).__name__)
             # Fall back to mock responses
             pass
     
-    # If API call failed or API key not available, use mock responses
-    message_lower = message.lower()
+    # If API call failed, was shed or API key not available, use mock responses
+    with span("chat.fallback"):
+        response = get_mock_response(message)
+    chat_responses.inc(source)
     
-    # Check for greetings
-    if any(word in message_lower for word in ["hello", "hi", "hey", "greetings"]):
-        response = random.choice(MOCK_RESPONSES["greeting"])
+    # Add response to context
+    await session_call(session_store.append, session_id, {"role": "assistant", "content": response})
     
-    # Check for help requests
-    elif any(word in message_lower for word in ["help", "assist", "support", "guide"]):
-        response = random.choice(MOCK_RESPONSES["help"])
+    return response, source
+
+async def get_ai_response(message: str, session_id: Optional[str] = None, context: Optional[List[Dict[str, Any]]] = None,
+                          seq: Optional[int] = None) -> str:
+    """
+    Generate an AI response to the user's message; see get_ai_response_with_source.
     
-    # Check for domain-specific queries
-    else:
-        # Identify the domain based on keywords
-        identified_domain = None
-        for domain, keywords in TOPIC_KEYWORDS.items():
-            if any(keyword in message_lower for keyword in keywords):
-                identified_domain = domain
-                break
+    Returns:
+        AI-generated response
+    """
+    response, _ = await get_ai_response_with_source(message, session_id, context, seq)
+    return response
+
+async def _stream_turn(message: str, session_id: str, context: Optional[List[Dict[str, Any]]],
+                       seq: Optional[int]) -> AsyncIterator[str]:
+    # Yields where the answer comes from ("cache", "llm", "fallback" or
+    # "degraded") once it is known, then the pieces of the answer
+    cache_topic = await _cache_topic(message, session_id, context)
+    formatted_history = await _start_turn(message, session_id, context, seq)
+    pieces = []
+    fallback_source = "fallback"
+    
+    cached = None
+    if cache_topic:
+        with span("chat.cache_lookup"):
+            cached = answer_cache.lookup(message, cache_topic)
+    if cached is not None:
+        pieces.append(cached)
+        chat_responses.inc("cache")
+        yield "cache"
+        yield cached
+    elif llm_client:
+        try:
+            # Covers the whole stream, including the time the client takes to read it
+            with span("chat.llm_stream"):
+                async with _gemini_slot():
+                    async with aclosing(llm_client.stream(formatted_history[:-1], message)) as stream:
+                        async for piece in stream:
+                            if not pieces:
+                                # Only reported once the first piece has really arrived
+                                yield "llm"
+                            pieces.append(piece)
+                            yield piece
+            if cache_topic:
+                answer_cache.store(message, cache_topic, "".join(pieces))
+            chat_responses.inc("llm")
+        except AdmissionRejected:
+            # Overloaded: a local answer now beats a better one too late
+            fallback_source = "degraded"
+        except Exception as e:
+            print(f"Error using Gemini API: {str(e)}")
+            llm_errors.inc(type(e).__name__)
+            # Pieces already sent cannot be taken back; only fall back if nothing was sent
+            if pieces:
+                chat_responses.inc("interrupted")
+                pieces.append(" [response interrupted]")
+                yield pieces[-1]
+    
+    if not pieces:
+        with span("chat.fallback"):
+            words = get_mock_response(message).split(" ")
+        chat_responses.inc(fallback_source)
+        yield fallback_source
+        for i, word in enumerate(words):
+            piece = word if i == len(words) - 1 else word + " "
+            pieces.append(piece)
+            yield piece
+            await asyncio.sleep(0)
+    
+    # Add the complete response to context
+    await session_call(session_store.append, session_id, {"role": "assistant", "content": "".join(pieces)})
+
+async def stream_ai_response_with_source(message: str, session_id: Optional[str] = None,
+                                         context: Optional[List[Dict[str, Any]]] = None,
+                                         seq: Optional[int] = None) -> Tuple[str, AsyncIterator[str]]:
+    """
+    Start a streamed answer to the user's message: the turn is recorded, the
+    answer cache and admission control are consulted, and Gemini is waited on
+    for its first piece, so callers know where the answer comes from before
+    they send anything. Mock responses are streamed word by word.
+    
+    Args:
+        message: The user's message
+        session_id: Unique identifier for the conversation session
+        context: Previous messages in the conversation
+        seq: Number of messages the client holds, for a delta request
         
-        if identified_domain:
-            response = random.choice(DOMAIN_RESPONSES[identified_domain])
-        else:
-            # Use general or fallback response
-            response = random.choice(MOCK_RESPONSES["general_info"] if random.random() > 0.3 else MOCK_RESPONSES["fallback"])
+    Returns:
+        Where the answer comes from ("cache", "llm", "fallback" or
+        "degraded") and an iterator over the pieces of the answer
     
-    # Add response to context
-    context_store[session_id].append({"role": "assistant", "content": response})
+    Raises:
+        SessionOutOfSyncError: If `seq` does not match the server's history
+    """
+    turn = _stream_turn(message, session_id or "default", context, seq)
+    # Once started, the generator is closed (releasing its slots) even if nobody reads it
+    source = await turn.__anext__()
+    return source, turn
+
+async def stream_ai_response(message: str, session_id: Optional[str] = None, context: Optional[List[Dict[str, Any]]] = None,
+                             seq: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Streaming variant of get_ai_response that yields the response in pieces
+    as they are generated; see stream_ai_response_with_source.
     
-    return response
\ No newline at end of file
+    Yields:
+        Consecutive pieces of the AI-generated response
+    """
+    _, pieces = await stream_ai_response_with_source(message, session_id, context, seq)
+    async with aclosing(pieces):
+        async for piece in pieces:
+            yield piece
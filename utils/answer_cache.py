@@ -0,0 +1,164 @@
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from utils.sentiment_cache import normalize_text
+
+# Function words that do not change what is being asked; question words are kept
+STOP_WORDS = frozenset({
+    "a", "an", "the", "i", "me", "my", "you", "your", "we", "our", "is", "are", "was", "be",
+    "do", "does", "did", "can", "could", "would", "should", "will", "to", "of", "for", "in",
+    "on", "at", "please", "there", "and"
+})
+
+
+class AnswerCache:
+    """
+    Cache of upstream LLM answers for first-turn questions.
+
+    The exact tier is keyed on the normalized message plus its detected topic.
+    The optional similarity tier indexes each cached question as a hashed
+    vector of its content words (stop words dropped, plural "s" stripped) and
+    their bigrams; on an exact miss, cached questions of the same
+    topic that share a feature are scored by TF-IDF cosine similarity and the
+    best one is served if it reaches `similarity_threshold`. Entries expire
+    after `ttl` seconds and the least recently used are evicted beyond
+    `max_entries`.
+
+    Args:
+        max_entries: Maximum number of cached answers
+        ttl: Seconds an answer stays valid (0 disables expiry)
+        similarity_threshold: Minimum cosine similarity for a paraphrase hit (0 disables the tier)
+        dimensions: Size of the hashed feature space
+        max_candidates: Maximum number of cached questions scored per lookup
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 3600,
+                 similarity_threshold: float = 0.85, dimensions: int = 2 ** 20,
+                 max_candidates: int = 64):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.dimensions = dimensions
+        self.max_candidates = max_candidates
+
+        # (normalized message, topic) -> (created, answer, term frequencies)
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        # (topic, feature) -> keys of the entries containing it
+        self._postings: Dict[Tuple[str, int], set] = {}
+        self._document_frequency: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _features(self, normalized: str) -> Dict[int, int]:
+        words = [w[:-1] if len(w) > 3 and w.endswith("s") else w
+                 for w in normalized.split() if w not in STOP_WORDS]
+        terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        counts: Dict[int, int] = {}
+        for term in terms:
+            feature = zlib.crc32(term.encode()) % self.dimensions
+            counts[feature] = counts.get(feature, 0) + 1
+        return counts
+
+    def _idf(self, feature: int) -> float:
+        return math.log((len(self._entries) + 1) / (self._document_frequency.get(feature, 0) + 1)) + 1
+
+    def _weights(self, counts: Dict[int, int]) -> Dict[int, float]:
+        weights = {feature: count * self._idf(feature) for feature, count in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {feature: w / norm for feature, w in weights.items()}
+
+    def _remove(self, key: Tuple[str, str]):
+        _, _, counts = self._entries.pop(key)
+        for feature in counts:
+            posting = self._postings.get((key[1], feature))
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self._postings[(key[1], feature)]
+            self._document_frequency[feature] -= 1
+            if not self._document_frequency[feature]:
+                del self._document_frequency[feature]
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _similar(self, normalized: str, topic: str) -> Optional[Tuple[str, str]]:
+        counts = self._features(normalized)
+        shared: Dict[Tuple[str, str], int] = {}
+        for feature in counts:
+            for key in self._postings.get((topic, feature), ()):
+                shared[key] = shared.get(key, 0) + 1
+        if not shared:
+            return None
+
+        query = self._weights(counts)
+        best_key, best_score = None, 0.0
+        for key in sorted(shared, key=shared.get, reverse=True)[:self.max_candidates]:
+            candidate = self._weights(self._entries[key][2])
+            score = sum(weight * candidate.get(feature, 0.0) for feature, weight in query.items())
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key if best_score >= self.similarity_threshold else None
+
+    def lookup(self, message: str, topic: str) -> Optional[str]:
+        """Return a cached answer for `message` under `topic`, or None."""
+        normalized = normalize_text(message)
+        key = (normalized, topic)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1]
+
+            if self.similarity_threshold > 0:
+                similar = self._similar(normalized, topic)
+                if similar is not None and not self._expired(self._entries[similar][0]):
+                    self._entries.move_to_end(similar)
+                    self.similar_hits += 1
+                    return self._entries[similar][1]
+
+            self.misses += 1
+            return None
+
+    def store(self, message: str, topic: str, answer: str):
+        """Cache `answer` for `message` under `topic`."""
+        normalized = normalize_text(message)
+        key = (normalized, topic)
+        counts = self._features(normalized)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time(), answer, counts)
+            for feature in counts:
+                self._postings.setdefault((topic, feature), set()).add(key)
+                self._document_frequency[feature] = self._document_frequency.get(feature, 0) + 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and the number of upstream calls the cache has saved."""
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "upstream_calls_saved": hits
+            }
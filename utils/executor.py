@@ -0,0 +1,156 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from utils.sentiment import analyze_sentiment, analyze_sentiment_batch, warm_up
+from utils.sentiment_cache import SentimentCache
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+
+class ExecutorBusyError(Exception):
+    """Raised when the scoring queue stays full for longer than the queue timeout."""
+
+
+def _warm_worker():
+    # Runs once in each worker process so the analyzers are loaded before the first request
+    warm_up()
+
+
+def _noop():
+    return None
+
+
+class SentimentExecutor:
+    """
+    Dispatches sentiment scoring so it never runs on the event loop.
+
+    Modes:
+        inline: score in the calling coroutine (blocks the loop; for debugging)
+        thread: score in a thread pool
+        process: score in a pool of warm worker processes, which sidesteps the GIL
+
+    At most `max_pending` texts are queued or running at once. Further callers
+    wait up to `queue_timeout` seconds for a slot and then get ExecutorBusyError,
+    so a flood of submissions is pushed back to clients instead of piling up.
+    When a cache is given, cached texts are answered without dispatching.
+
+    Args:
+        mode: One of "inline", "thread" or "process"
+        workers: Number of pool workers (defaults to the CPU count)
+        max_pending: Maximum number of texts queued or being scored
+        queue_timeout: Seconds to wait for a free slot before rejecting
+        cache: Optional result cache consulted before scoring
+    """
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None,
+                 max_pending: int = 256, queue_timeout: float = 5.0,
+                 cache: Optional[SentimentCache] = None):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.cache = cache
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def _get_pool(self) -> Executor:
+        # start() may run on a warm-up thread while requests already arrive
+        with self._pool_lock:
+            if self._pool is None:
+                if self.mode == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sentiment")
+            return self._pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        return self._slots
+
+    def start(self):
+        """Create the pool and make every worker load the analyzers up front."""
+        if self.mode == "inline":
+            warm_up()
+            return
+        pool = self._get_pool()
+        task = _noop if self.mode == "process" else _warm_worker
+        for future in [pool.submit(task) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, func, *args):
+        """Run `func(*args)` according to the mode, holding a queue slot."""
+        if self.mode == "inline":
+            return func(*args)
+
+        slots = self._get_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ExecutorBusyError("Sentiment scoring queue is full")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), func, *args)
+        finally:
+            slots.release()
+
+    async def analyze(self, text: str) -> Dict[str, Any]:
+        """Score `text` with `analyze_sentiment` off the event loop."""
+        if self.cache is not None:
+            # A miss in memory falls through to the disk tier, which blocks
+            cached = await asyncio.to_thread(self.cache.get, text)
+            if cached is not None:
+                return cached
+        result = await self.run(analyze_sentiment, text)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, text, result)
+        return result
+
+    async def analyze_batch(self, texts: List[str], chunk_size: int = 256) -> List[Dict[str, Any]]:
+        """
+        Score many texts, split into chunks that are spread across the workers.
+        Results are returned in the same order as `texts`.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        cached_results = [None] * len(texts)
+        if self.cache is not None:
+            # Misses read the disk tier; look the whole batch up off the event loop
+            cached_results = await asyncio.to_thread(lambda: [self.cache.get(text) for text in texts])
+        for index, (text, cached) in enumerate(zip(texts, cached_results)):
+            if cached is not None:
+                results[index] = cached
+            else:
+                # Identical texts within the batch are scored once
+                pending.setdefault(text, []).append(index)
+
+        to_score = list(pending)
+        if to_score:
+            # Small batches are still split so every worker gets a share
+            chunk_size = max(1, min(chunk_size, -(-len(to_score) // self.workers)))
+            chunks = [to_score[i:i + chunk_size] for i in range(0, len(to_score), chunk_size)]
+            scored = await asyncio.gather(*(self.run(analyze_sentiment_batch, chunk) for chunk in chunks))
+            flat = [r for chunk_results in scored for r in chunk_results]
+            for text, result in zip(to_score, flat):
+                for index in pending[text]:
+                    results[index] = dict(result)
+            if self.cache is not None:
+                # One disk transaction for the whole batch, off the event loop
+                await asyncio.to_thread(self.cache.put_many, list(zip(to_score, flat)))
+        return results
@@ -0,0 +1,112 @@
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from typing import Dict, Any, Iterable, Iterator, List
+
+from utils.storage import FEEDBACK_COLUMNS
+
+# Parquet export is optional: it needs pyarrow, which is imported only when used
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _batches(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_ndjson(records: Iterable[Dict[str, Any]], batch_size: int = 1000) -> Iterator[bytes]:
+    """Yield `records` as newline-delimited JSON, one chunk per batch."""
+    for batch in _batches(records, batch_size):
+        yield "".join(json.dumps(record) + "\n" for record in batch).encode("utf-8")
+
+
+def export_csv(records: Iterable[Dict[str, Any]], batch_size: int = 1000) -> Iterator[bytes]:
+    """Yield `records` as CSV with a header row, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FEEDBACK_COLUMNS)
+    for batch in _batches(records, batch_size):
+        writer.writerows([record.get(column) for column in FEEDBACK_COLUMNS] for record in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file whose contents are handed out and dropped as they are produced
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_parquet(records: Iterable[Dict[str, Any]], row_group_size: int = 10000) -> Iterator[bytes]:
+    """
+    Yield `records` as a Parquet file, written one row group at a time so only
+    one group is held in memory.
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.string()), ("text", pa.string()), ("category", pa.string()),
+        ("user_id", pa.string()), ("sentiment", pa.string()), ("score", pa.float64()),
+        ("timestamp", pa.string()), ("scorer_version", pa.string()),
+        ("cluster_id", pa.string())
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in _batches(records, row_group_size):
+            columns = {column: [record.get(column) for record in batch] for column in FEEDBACK_COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into gzip format incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,26 @@
+import threading
+from typing import Any, Callable
+
+
+class Lazy:
+    """
+    A value created on first use, at most once even when several threads ask
+    for it at the same time. After creation, `get` is a plain attribute check.
+
+    Args:
+        factory: Called without arguments to create the value
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self.loaded = False
+
+    def get(self) -> Any:
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self._value = self._factory()
+                    self.loaded = True
+        return self._value
@@ -0,0 +1,228 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from utils.lazy import Lazy
+
+
+def _load_retryable_errors() -> tuple:
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.TooManyRequests,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        ConnectionError,
+    )
+
+# Upstream errors worth retrying; anything else fails immediately.
+# Resolved on first use because importing the Google SDK takes most of a second.
+retryable_errors = Lazy(_load_retryable_errors)
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a request does not complete before its deadline."""
+
+
+class GeminiClient:
+    """
+    Shared, concurrency-limited client for the Gemini API.
+
+    Model instances are created once and reused. The SDK's blocking calls run
+    on a dedicated thread pool so they never block the event loop, and at most
+    `max_concurrency` requests are in flight per process. Every request has an
+    overall deadline covering all attempts; retryable upstream errors are
+    retried with exponential backoff and full jitter. The SDK itself is
+    imported and configured on first use, or ahead of time by `warm_up`.
+
+    Args:
+        api_key: Gemini API key
+        model_name: Name of the Gemini model
+        max_concurrency: Maximum number of in-flight upstream requests
+        timeout: Overall deadline in seconds for one request, retries included
+        max_retries: Number of retries after the first attempt
+        backoff_base: Base delay in seconds for the retry backoff
+        backoff_max: Maximum delay in seconds between retries
+        api_endpoint: Alternative API endpoint, e.g. a local fake server
+    """
+
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash",
+                 max_concurrency: int = 16, timeout: float = 20.0, max_retries: int = 2,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 api_endpoint: Optional[str] = None):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._api_key = api_key
+        self._api_endpoint = api_endpoint
+        self._genai = Lazy(self._load_sdk)
+        self._models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def _load_sdk(self):
+        import google.generativeai as genai
+        if self._api_endpoint:
+            genai.configure(api_key=self._api_key, transport="rest", client_options={"api_endpoint": self._api_endpoint})
+        else:
+            genai.configure(api_key=self._api_key)
+        retryable_errors.get()
+        return genai
+
+    def _model(self):
+        model = self._models.get(self.model_name)
+        if model is None:
+            genai = self._genai.get()
+            with self._models_lock:
+                model = self._models.get(self.model_name)
+                if model is None:
+                    model = self._models[self.model_name] = genai.GenerativeModel(self.model_name)
+        return model
+
+    def warm_up(self):
+        """Import and configure the SDK and create the model, without calling the API."""
+        self._model()
+
+    @property
+    def loaded(self) -> bool:
+        return self._genai.loaded
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    def _send(self, history: List[Dict[str, Any]], message: str, timeout: float) -> str:
+        chat = self._model().start_chat(history=history)
+        # Retries are ours; the SDK's default policy would keep retrying for
+        # up to 10 minutes after the deadline has given up on the call
+        response = chat.send_message(message, request_options={"timeout": timeout, "retry": None})
+        return response.text
+
+    def _release_when_done(self, slots: asyncio.Semaphore, future: asyncio.Future):
+        # The slot stays taken until the pool thread has really finished the call,
+        # so abandoned calls still count against max_concurrency
+        def release(done: asyncio.Future):
+            slots.release()
+            if not done.cancelled():
+                done.exception()
+
+        if future.done():
+            release(future)
+        else:
+            future.add_done_callback(release)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def generate(self, history: List[Dict[str, Any]], message: str) -> str:
+        """
+        Send `message` after `history` (Gemini-formatted) and return the reply text.
+
+        Raises:
+            LLMTimeoutError: If no attempt succeeds before the deadline
+        """
+        deadline = time.monotonic() + self.timeout
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMTimeoutError(f"Gemini request exceeded {self.timeout}s deadline")
+            try:
+                slots = self._get_slots()
+                await asyncio.wait_for(slots.acquire(), timeout=remaining)
+                future = None
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMTimeoutError(f"Gemini request exceeded {self.timeout}s deadline")
+                    future = loop.run_in_executor(self._pool, self._send, history, message, remaining)
+                    done, _ = await asyncio.wait({future}, timeout=remaining)
+                    if not done:
+                        raise LLMTimeoutError(f"Gemini request exceeded {self.timeout}s deadline")
+                    return future.result()
+                finally:
+                    if future is None:
+                        slots.release()
+                    else:
+                        self._release_when_done(slots, future)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Gemini request exceeded {self.timeout}s deadline")
+            except retryable_errors.get():
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                if time.monotonic() + delay >= deadline:
+                    raise LLMTimeoutError(f"Gemini request exceeded {self.timeout}s deadline")
+                await asyncio.sleep(delay)
+
+    def _send_stream(self, history: List[Dict[str, Any]], message: str, timeout: float, emit, stop: threading.Event):
+        try:
+            chat = self._model().start_chat(history=history)
+            for chunk in chat.send_message(message, stream=True, request_options={"timeout": timeout, "retry": None}):
+                if stop.is_set():
+                    # The reader has gone; stop pulling the rest of the reply
+                    return
+                emit(chunk.text, None)
+            emit(None, None)
+        except Exception as e:
+            emit(None, e)
+
+    async def stream(self, history: List[Dict[str, Any]], message: str) -> AsyncIterator[str]:
+        """
+        Like `generate`, but yields the reply in pieces as the model produces them.
+        Streams are not retried; `timeout` bounds the wait for each piece.
+
+        Raises:
+            LLMTimeoutError: If the next piece does not arrive within the timeout
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(text, error):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (text, error))
+            except RuntimeError:
+                # The loop has gone away; nobody is listening anymore
+                pass
+
+        slots = self._get_slots()
+        await slots.acquire()
+        stop = threading.Event()
+        try:
+            future = loop.run_in_executor(self._pool, self._send_stream, history, message, self.timeout, emit, stop)
+        except BaseException:
+            slots.release()
+            raise
+        try:
+            while True:
+                try:
+                    text, error = await asyncio.wait_for(queue.get(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"Gemini stream stalled for {self.timeout}s")
+                if error is not None:
+                    raise error
+                if text is None:
+                    return
+                yield text
+        finally:
+            stop.set()
+            self._release_when_done(slots, future)
+
+    def shutdown(self):
+        """Drop queued upstream calls; calls already running finish within their timeout."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,273 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.sentiment_cache import normalize_text
+
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash/LSH index that groups near-identical texts into clusters.
+
+    A text is reduced to its set of byte shingles, and the set to a
+    MinHash signature of `num_perm` values; the share of equal values in two
+    signatures estimates the Jaccard similarity of the two sets. Signatures
+    are split into `bands` bands and each band is hashed into a bucket, so
+    only texts sharing at least one bucket are compared. A text whose best
+    match is at least `threshold` similar joins that match's cluster;
+    otherwise it starts a new cluster, identified by the id of its record.
+
+    Only the first text of each cluster is indexed, so a flood of copies does
+    not grow the buckets, and a bucket stops growing at `max_bucket` clusters,
+    which bounds the comparisons per text. Clusters not seen for `window_seconds` are evicted,
+    and the least recently seen ones once there are more than `max_clusters`.
+    Only the first `max_text_bytes` of a normalized text are shingled, and
+    shingles are hashed in fixed-size chunks, which bounds the time and memory
+    spent on one text whatever its length.
+
+    Args:
+        num_perm: Values per signature
+        bands: LSH bands; num_perm must be a multiple of it
+        threshold: Estimated Jaccard similarity at which texts are near-duplicates
+        shingle_size: Bytes of normalized UTF-8 text per shingle (at most 8)
+        window_seconds: Seconds a cluster is kept after its last text
+        max_clusters: Maximum number of clusters kept
+        max_bucket: Clusters kept per bucket; later ones are left out of full buckets
+        max_text_bytes: Bytes of normalized text shingled per text
+        seed: Seed of the hash functions
+    """
+
+    # Shingles hashed at once; bounds the temporary array at num_perm x this many values
+    CHUNK_SHINGLES = 2048
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.8, shingle_size: int = 4,
+                 window_seconds: float = 24 * 3600, max_clusters: int = 50000, max_bucket: int = 32,
+                 max_text_bytes: int = 16384, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if not 1 <= shingle_size <= 8:
+            raise ValueError("shingle_size must be between 1 and 8")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.window_seconds = window_seconds
+        self.max_clusters = max_clusters
+        self.max_bucket = max_bucket
+        self.max_text_bytes = max_text_bytes
+
+        # Multiply-shift hashing: (a * x + b) >> 32 over 64-bit words, one (a, b) pair per permutation
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        # Odd multipliers combining the values of a band into one bucket key
+        self._band_mix = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+        # cluster id -> [signature, last seen, size], least recently seen first
+        self._clusters: "OrderedDict[str, list]" = OrderedDict()
+        # (band, hash of the band's values) -> cluster id, or a list of them once several share it
+        self._buckets: Dict[Tuple[int, int], Any] = {}
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # Assignments and discards made while a rebuild streams storage, or None when none runs
+        self._pending: Optional[List[tuple]] = None
+        self.duplicates = 0
+        self.evictions = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        """Return the MinHash signature of `text` (case, punctuation and spacing ignored)."""
+        # Normalizing only shortens a text, so the rest of a long one is never even read
+        data = np.frombuffer(normalize_text(text[:4 * self.max_text_bytes]).encode()[:self.max_text_bytes],
+                             dtype=np.uint8).astype(np.uint64)
+        k = self.shingle_size
+        if len(data) < k:
+            data = np.concatenate((data, np.zeros(k - len(data), dtype=np.uint64)))
+        # Every shingle of k bytes packed into one integer, all shingles at once
+        count = len(data) - k + 1
+        shingles = data[:count] << np.uint64(8 * (k - 1))
+        for offset in range(1, k):
+            shingles |= data[offset:offset + count] << np.uint64(8 * (k - 1 - offset))
+        signature = None
+        with np.errstate(over="ignore"):
+            for start in range(0, count, self.CHUNK_SHINGLES):
+                chunk = shingles[start:start + self.CHUNK_SHINGLES]
+                values = ((np.outer(self._a, chunk) + self._b[:, None]) >> np.uint64(32)).min(axis=1)
+                signature = values if signature is None else np.minimum(signature, values)
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray):
+        with np.errstate(over="ignore"):
+            hashes = (signature.reshape(self.bands, self.rows).astype(np.uint64) * self._band_mix).sum(axis=1)
+        return list(enumerate(hashes.tolist()))
+
+    def _best_match(self, signature: np.ndarray) -> Tuple[Optional[str], float]:
+        candidates = set()
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            if isinstance(bucket, list):
+                candidates.update(bucket)
+            else:
+                candidates.add(bucket)
+        if not candidates:
+            return None, 0.0
+        candidates = list(candidates)
+        signatures = np.stack([self._clusters[cluster_id][0] for cluster_id in candidates])
+        matches = np.count_nonzero(signatures == signature, axis=1)
+        best = int(matches.argmax())
+        return candidates[best], float(matches[best]) / self.num_perm
+
+    def _insert(self, cluster_id: str, signature: np.ndarray, now: float):
+        self._clusters[cluster_id] = [signature, now, 1]
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = cluster_id
+            elif isinstance(bucket, list):
+                # A band shared by this many clusters only matches common wording; stop growing it
+                if len(bucket) < self.max_bucket:
+                    bucket.append(cluster_id)
+            else:
+                self._buckets[key] = [bucket, cluster_id]
+
+    def _remove(self, cluster_id: str):
+        signature = self._clusters.pop(cluster_id)[0]
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if isinstance(bucket, list):
+                if cluster_id in bucket:
+                    bucket.remove(cluster_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket[0]
+            elif bucket == cluster_id:
+                del self._buckets[key]
+
+    def _evict(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._clusters:
+            cluster_id, (_, last_seen, _) = next(iter(self._clusters.items()))
+            if last_seen >= cutoff and len(self._clusters) <= self.max_clusters:
+                break
+            self._remove(cluster_id)
+            self.evictions += 1
+
+    def assign(self, record_id: str, text: str, now: Optional[float] = None) -> str:
+        """
+        Return the cluster of a new text: the cluster of its closest
+        near-duplicate, or a new cluster named `record_id`.
+        """
+        signature = self.signature(text)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._evict(now)
+            cluster_id, similarity = self._best_match(signature)
+            if cluster_id is not None and similarity >= self.threshold:
+                cluster = self._clusters[cluster_id]
+                cluster[1] = max(cluster[1], now)
+                cluster[2] += 1
+                self._clusters.move_to_end(cluster_id)
+                self.duplicates += 1
+            else:
+                cluster_id = record_id
+                self._insert(record_id, signature, now)
+            if self._pending is not None:
+                self._pending.append(("assign", record_id, cluster_id, signature, now))
+            return cluster_id
+
+    def discard(self, cluster_id: str):
+        """Forget a cluster, e.g. when the record that started it could not be stored."""
+        with self._lock:
+            if cluster_id in self._clusters:
+                self._remove(cluster_id)
+            if self._pending is not None:
+                self._pending.append(("discard", cluster_id))
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]):
+        """
+        Recreate the clusters from stored records, oldest first. Records that
+        started a cluster (cluster_id equal to their id) are indexed again.
+        Records stored without a cluster id (before detection, or with it
+        disabled) are indexed as clusters of their own, as the aggregates
+        count them, so new near-duplicates can still join them.
+
+        The new clusters are built aside while the current ones keep
+        matching new texts, then swapped in. Assignments made meanwhile are
+        replayed onto them unless the stream already held their record.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            # Same parameters and hash functions, empty clusters
+            fresh = copy.copy(self)
+            fresh._clusters, fresh._buckets = OrderedDict(), {}
+            fresh._lock, fresh._pending, fresh.evictions = threading.Lock(), None, 0
+            try:
+                seen = fresh._load(records)
+                with self._lock:
+                    fresh._replay(self._pending, seen)
+                    fresh._evict(time.time())
+                    self._clusters, self._buckets = fresh._clusters, fresh._buckets
+                    self.evictions += fresh.evictions
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def _load(self, records: Iterable[Dict[str, Any]]) -> set:
+        # Index stored records into this (not yet shared) instance; returns their ids
+        seen = set()
+        for record in records:
+            seen.add(record.get("id"))
+            try:
+                last_seen = datetime.fromisoformat(record["timestamp"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            cluster_id = record.get("cluster_id")
+            if cluster_id is None or cluster_id == record.get("id"):
+                self._evict(last_seen)
+                self._insert(record["id"], self.signature(record.get("text") or ""), last_seen)
+                continue
+            cluster = self._clusters.get(cluster_id)
+            if cluster is not None:
+                cluster[1] = max(cluster[1], last_seen)
+                cluster[2] += 1
+                self._clusters.move_to_end(cluster_id)
+        return seen
+
+    def _replay(self, events: List[tuple], seen: set):
+        # Apply the assignments and discards made on the live index during a rebuild
+        for event in events:
+            if event[0] == "discard":
+                if event[1] in self._clusters:
+                    self._remove(event[1])
+                continue
+            _, record_id, cluster_id, signature, now = event
+            if record_id in seen:
+                continue
+            if cluster_id == record_id:
+                if cluster_id not in self._clusters:
+                    self._insert(record_id, signature, now)
+                continue
+            cluster = self._clusters.get(cluster_id)
+            if cluster is not None:
+                cluster[1] = max(cluster[1], now)
+                cluster[2] += 1
+                self._clusters.move_to_end(cluster_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clusters": len(self._clusters),
+                "buckets": len(self._buckets),
+                "duplicates": self.duplicates,
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+                "window_seconds": self.window_seconds,
+                "max_clusters": self.max_clusters
+            }
@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional
+
+# Distinct stacks kept per capture; further new stacks are counted together
+MAX_STACKS = 20000
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for a running server.
+
+    While running, a background thread wakes every `interval` seconds and
+    records the current stack of every other thread. Stacks are aggregated
+    in the "collapsed" format (frames joined by ";" plus a sample count),
+    which flame graph tools read directly. Nothing is instrumented, so the
+    cost is one stack walk per thread per sample.
+
+    Args:
+        interval: Seconds between samples
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._stacks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: Optional[float] = None):
+        """Clear previous samples and start sampling."""
+        if self._thread is not None:
+            return
+        if interval is not None:
+            self.interval = interval
+        with self._lock:
+            self._stacks = {}
+            self.samples = 0
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling; the samples stay available until the next start."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    @staticmethod
+    def _describe(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    names = []
+                    while frame is not None:
+                        names.append(self._describe(frame))
+                        frame = frame.f_back
+                    stack = ";".join(reversed(names))
+                    if stack not in self._stacks and len(self._stacks) >= MAX_STACKS:
+                        stack = "(other stacks)"
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """Return the samples in collapsed-stack format, most frequent first."""
+        with self._lock:
+            items = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval": self.interval,
+                "samples": self.samples,
+                "distinct_stacks": len(self._stacks),
+                "started_at": self.started_at
+            }
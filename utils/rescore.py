@@ -0,0 +1,198 @@
+"""
+Re-score stored feedback with the current sentiment scorer.
+
+Run this after changing the scoring weights, thresholds or engine in
+utils/sentiment.py: the sentiment and score of every record whose
+scorer_version differs from the current one are recomputed.
+
+The corpus is read in keyset-ordered chunks that are scored on a process
+pool. New scores are staged in a checkpoint database next to the data,
+together with the position reached, so an interrupted run picks up where it
+stopped. Once every chunk is staged, the new scores are swapped into the
+repository in a single transaction and, with --api-url, the running API is
+asked to rebuild its aggregates (it must run with
+MAINTENANCE_ENDPOINTS_ENABLED=true). Memory stays bounded by the chunks in flight.
+
+With the SQLite backend the API can keep running during the job; records
+it stores meanwhile are picked up before the swap. The log backend is not
+safe to share between processes, so stop the API first.
+
+Usage:
+    python -m utils.rescore [--backend sqlite] [--data-dir data] [--engine combined]
+        [--chunk-size 2000] [--workers N] [--restart] [--api-url http://localhost:8000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.sentiment import ENGINES, SENTIMENT_ENGINE, analyze_sentiment_batch, scorer_version
+from utils.storage import FeedbackRepository, create_feedback_repository, encode_cursor
+
+
+def _score_chunk(texts: List[str], engine: str) -> List[Tuple[str, float]]:
+    # Runs in a pool worker; only the labels and scores travel back
+    return [(result["sentiment"], result["score"]) for result in analyze_sentiment_batch(texts, engine)]
+
+
+class RescoreJob:
+    """
+    Checkpointed re-scoring of every stored record whose scorer version is
+    not the one of `engine` with the current weights and thresholds.
+
+    Args:
+        repository: Feedback repository to re-score
+        checkpoint_path: SQLite file holding the staged scores and progress
+        engine: Sentiment engine to score with (see utils.sentiment.ENGINES)
+        chunk_size: Records read and scored per task
+        workers: Scoring processes
+    """
+
+    def __init__(self, repository: FeedbackRepository, checkpoint_path: str, engine: str = SENTIMENT_ENGINE,
+                 chunk_size: int = 2000, workers: Optional[int] = None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+        self.repository = repository
+        self.checkpoint_path = checkpoint_path
+        self.engine = engine
+        self.version = scorer_version(engine)
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+
+        self._db = sqlite3.connect(checkpoint_path)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS staged (id TEXT PRIMARY KEY, sentiment TEXT, score REAL)")
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        state = dict(self._db.execute("SELECT key, value FROM state"))
+        if state.get("version") != self.version:
+            # Scores staged for another scorer configuration are of no use
+            self.reset()
+            return self._load_state()
+        return {"version": state["version"], "cursor": state.get("cursor") or None,
+                "scanned": int(state["scanned"]), "rescored": int(state["rescored"])}
+
+    def reset(self):
+        """Drop the staged scores and start over from the first record."""
+        with self._db:
+            self._db.execute("DELETE FROM staged")
+            self._db.execute("DELETE FROM state")
+            self._db.executemany("INSERT INTO state (key, value) VALUES (?, ?)",
+                                 [("version", self.version), ("cursor", ""), ("scanned", "0"), ("rescored", "0")])
+
+    def _chunks(self) -> Iterator[Tuple[List[Dict[str, Any]], str]]:
+        # Keyset pages in (timestamp, id) order; records stored during the job sort last and are still reached
+        cursor = self.state["cursor"]
+        while True:
+            page, next_cursor = self.repository.list(limit=self.chunk_size, cursor=cursor)
+            if not page:
+                return
+            cursor = encode_cursor(page[-1])
+            yield page, cursor
+            if next_cursor is None:
+                return
+
+    def _stage(self, page: List[Dict[str, Any]], stale: List[Dict[str, Any]], scores: List[Tuple[str, float]], cursor: str):
+        # Scores and the position after them are committed together, so a crash never skips or repeats a chunk
+        self.state["cursor"] = cursor
+        self.state["scanned"] += len(page)
+        self.state["rescored"] += len(stale)
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO staged (id, sentiment, score) VALUES (?, ?, ?)",
+                                 [(record["id"], sentiment, score) for record, (sentiment, score) in zip(stale, scores)])
+            self._db.executemany("UPDATE state SET value = ? WHERE key = ?",
+                                 [(cursor, "cursor"), (str(self.state["scanned"]), "scanned"),
+                                  (str(self.state["rescored"]), "rescored")])
+
+    def score(self, progress_every: float = 5.0):
+        """Score and stage every remaining chunk, keeping at most two chunks per worker in flight."""
+        started = last_report = time.perf_counter()
+        scanned_before = self.state["scanned"]
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for page, cursor in self._chunks():
+                    stale = [record for record in page if record.get("scorer_version") != self.version]
+                    pending.append((page, stale, cursor, pool.submit(_score_chunk, [r["text"] for r in stale], self.engine)))
+                    while pending and (len(pending) >= 2 * self.workers or pending[0][3].done()):
+                        page, stale, cursor, future = pending.popleft()
+                        self._stage(page, stale, future.result(), cursor)
+                    if time.perf_counter() - last_report >= progress_every:
+                        last_report = time.perf_counter()
+                        rate = (self.state["scanned"] - scanned_before) / (last_report - started)
+                        print(f"scanned {self.state['scanned']}, rescored {self.state['rescored']} ({rate:.0f} records/s)")
+                while pending:
+                    page, stale, cursor, future = pending.popleft()
+                    self._stage(page, stale, future.result(), cursor)
+            except BaseException:
+                for *_, future in pending:
+                    future.cancel()
+                raise
+
+    def staged_updates(self) -> Iterator[Tuple[str, str, float, str]]:
+        """Yield every staged score as an update for `FeedbackRepository.update_scores`."""
+        for record_id, sentiment, score in self._db.execute("SELECT id, sentiment, score FROM staged"):
+            yield record_id, sentiment, score, self.version
+
+    def swap(self):
+        """Apply every staged score to the repository in one atomic update, then clear the checkpoint."""
+        self.repository.update_scores(self.staged_updates())
+        self.reset()
+
+    def close(self):
+        self._db.close()
+
+
+def notify_api(api_url: str):
+    """Ask a running API to rebuild its aggregates from the re-scored records."""
+    import httpx
+    response = httpx.post(api_url.rstrip("/") + "/feedback/aggregates/rebuild", timeout=600)
+    response.raise_for_status()
+    print(f"API aggregates rebuilt: {response.json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=os.getenv("FEEDBACK_BACKEND", "sqlite").lower())
+    parser.add_argument("--data-dir", default=os.getenv("CITIZEN_AI_DATA_DIR") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+    parser.add_argument("--engine", default=SENTIMENT_ENGINE, choices=ENGINES)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=0, help="Scoring processes (default: one per CPU)")
+    parser.add_argument("--restart", action="store_true", help="Discard the checkpoint and start from the beginning")
+    parser.add_argument("--api-url", default="", help="Running API to notify once the new scores are in place")
+    args = parser.parse_args()
+
+    repository = create_feedback_repository(args.backend, args.data_dir)
+    job = RescoreJob(repository, os.path.join(args.data_dir, "rescore_checkpoint.db"), engine=args.engine,
+                     chunk_size=args.chunk_size, workers=args.workers or None)
+    if args.restart:
+        job.reset()
+    elif job.state["scanned"]:
+        print(f"Resuming after {job.state['scanned']} records ({job.state['rescored']} rescored)")
+
+    print(f"Re-scoring with {job.version} on {job.workers} workers")
+    started = time.perf_counter()
+    try:
+        job.score()
+    except KeyboardInterrupt:
+        print(f"Interrupted after {job.state['scanned']} records; run again to resume")
+        sys.exit(1)
+    scanned, rescored = job.state["scanned"], job.state["rescored"]
+    job.swap()
+    job.close()
+    print(f"Scanned {scanned} records, rescored {rescored} in {time.perf_counter() - started:.1f} s")
+
+    if args.api_url:
+        notify_api(args.api_url)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,161 @@
-from textblob import TextBlob
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from typing import Dict, Any
+import os
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from utils.lazy import Lazy
+from utils.metrics import span
 
-# Initialize VADER sentiment analyzer
-vader = SentimentIntensityAnalyzer()
+def _load_textblob():
+    # TextBlob pulls in NLTK, which dominates the import time of this module
+    from textblob import TextBlob
+    return TextBlob
 
-def analyze_sentiment(text: str) -> Dict[str, Any]:
+def _load_vader():
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+def _load_lexicon_scorer():
+    from utils.lexicon_sentiment import LexiconScorer
+    return LexiconScorer.from_vader(vader.get())
+
+# The analyzers are loaded on first use (or by warm_up), not at import
+textblob_class = Lazy(_load_textblob)
+vader = Lazy(_load_vader)
+lexicon_scorer = Lazy(_load_lexicon_scorer)
+
+# combined: TextBlob and VADER blended; vader: VADER alone; fast: vectorized VADER lexicon.
+# fast pays off on batches; for one text at a time vader is quicker (see benchmarks/sentiment_engines.py)
+ENGINES = ("combined", "vader", "fast")
+SENTIMENT_ENGINE = os.getenv("SENTIMENT_ENGINE", "combined").lower()
+if SENTIMENT_ENGINE not in ENGINES:
+    raise ValueError(f"Unknown SENTIMENT_ENGINE {SENTIMENT_ENGINE!r}, expected one of {', '.join(ENGINES)}")
+
+_ENGINE_ANALYZERS = {"combined": (textblob_class, vader), "vader": (vader,), "fast": (lexicon_scorer,)}
+
+def warm_up(engine: Optional[str] = None):
+    """Load the engine's analyzers and run them once, so the first request does not pay for it."""
+    analyze_sentiment("warm up", engine)
+
+def analyzers_loaded(engine: Optional[str] = None) -> bool:
+    """Whether the engine's analyzers have been loaded in this process."""
+    return all(analyzer.loaded for analyzer in _ENGINE_ANALYZERS[engine or SENTIMENT_ENGINE])
+
+# Scoring weights and classification thresholds
+VADER_WEIGHT = 0.7
+TEXTBLOB_WEIGHT = 0.3
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+def scorer_version(engine: str) -> str:
+    """Identifies a scoring configuration; changes whenever the engine, a weight or a threshold does."""
+    if engine == "combined":
+        return "combined:v{}:t{}:p{}:n{}".format(VADER_WEIGHT, TEXTBLOB_WEIGHT, POSITIVE_THRESHOLD, NEGATIVE_THRESHOLD)
+    return "{}:p{}:n{}".format(engine, POSITIVE_THRESHOLD, NEGATIVE_THRESHOLD)
+
+SCORER_VERSION = scorer_version(SENTIMENT_ENGINE)
+
+def classify(score: float) -> str:
+    """Map a score in [-1, 1] to positive, neutral or negative."""
+    if score >= POSITIVE_THRESHOLD:
+        return "positive"
+    if score <= NEGATIVE_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+def analyze_sentiment(text: str, engine: Optional[str] = None) -> Dict[str, Any]:
     """
-    Analyze sentiment of text using both TextBlob and VADER,
-    then combine the results for more accurate sentiment analysis.
+    Analyze sentiment of text with the selected engine. The default, combined,
+    uses both TextBlob and VADER and combines the results for more accurate
+    sentiment analysis.
     
     Args:
         text: The text to analyze
+        engine: One of ENGINES; defaults to SENTIMENT_ENGINE
         
     Returns:
         Dictionary with sentiment classification and score
     """
+    engine = engine or SENTIMENT_ENGINE
+    if engine == "fast":
+        return _fast_results([text])[0]
+    if engine == "vader":
+        with span("sentiment.vader"):
+            vader_scores = vader.get().polarity_scores(text)
+        return {
+            "sentiment": classify(vader_scores['compound']),
+            "score": vader_scores['compound'],
+            "vader_score": vader_scores['compound'],
+            "vader_details": vader_scores
+        }
+
     # Get TextBlob sentiment
-    blob = TextBlob(text)
-    textblob_polarity = blob.sentiment.polarity
+    with span("sentiment.textblob"):
+        blob = textblob_class.get()(text)
+        textblob_polarity = blob.sentiment.polarity
     
     # Get VADER sentiment
-    vader_scores = vader.polarity_scores(text)
+    with span("sentiment.vader"):
+        vader_scores = vader.get().polarity_scores(text)
     vader_compound = vader_scores['compound']
     
     # Combine scores (weighted average, giving more weight to VADER)
-    combined_score = (vader_compound * 0.7) + (textblob_polarity * 0.3)
-    
-    # Classify sentiment
-    if combined_score >= 0.05:
-        sentiment = "positive"
-    elif combined_score <= -0.05:
-        sentiment = "negative"
-    else:
-        sentiment = "neutral"
+    combined_score = (vader_compound * VADER_WEIGHT) + (textblob_polarity * TEXTBLOB_WEIGHT)
     
     return {
-        "sentiment": sentiment,
+        "sentiment": classify(combined_score),
         "score": combined_score,
         "textblob_score": textblob_polarity,
         "vader_score": vader_compound,
         "vader_details": vader_scores
     }
 
+def _fast_results(texts: List[str]) -> List[Dict[str, Any]]:
+    with span("sentiment.fast"):
+        scores = lexicon_scorer.get().score_batch(texts).tolist()
+    return [{"sentiment": classify(score), "score": score} for score in scores]
+
+def analyze_sentiment_batch(texts: List[str], engine: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Analyze the sentiment of a chunk of texts in one call.
+    Used to ship whole chunks to a worker instead of one task per text;
+    the fast engine scores the whole chunk with one set of array operations.
+    
+    Args:
+        texts: The texts to analyze
+        engine: One of ENGINES; defaults to SENTIMENT_ENGINE
+        
+    Returns:
+        List of results in the same order, as returned by analyze_sentiment
+    """
+    engine = engine or SENTIMENT_ENGINE
+    if engine == "fast":
+        return _fast_results(texts)
+    return [analyze_sentiment(text, engine) for text in texts]
+
+# Words too common to say anything about what a text is about
+STOP_WORDS = frozenset({
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with",
+    "about", "is", "are", "was", "were", "be", "been", "being", "have", "has",
+    "had", "do", "does", "did", "i", "you", "he", "she", "it", "we", "they",
+    "this", "that", "these", "those", "my", "your", "his", "her", "its", "our", "their"
+})
+
+_KEYWORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def keyword_counts(text: str) -> Counter:
+    """
+    Count the candidate keywords in text: lowercase words longer than two
+    characters that are not stop words.
+    
+    Args:
+        text: The text to analyze
+        
+    Returns:
+        Counter of keyword frequencies, in order of first occurrence
+    """
+    return Counter(word for word in _KEYWORD.findall(text.lower())
+                   if len(word) > 2 and word not in STOP_WORDS)
+
 def extract_keywords(text: str, top_n: int = 5) -> list:
     """
     Extract important keywords from text.
@@ -55,25 +168,5 @@ def extract_keywords(text: str, top_n: int = 5) -> list:
     Returns:
         List of top keywords
     """
-    # Convert to lowercase and tokenize
-    blob = TextBlob(text.lower())
-    
-    # Get word frequencies, excluding common stop words
-    word_freq = {}
-    stop_words = {
-        "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "with",
-        "about", "is", "are", "was", "were", "be", "been", "being", "have", "has",
-        "had", "do", "does", "did", "i", "you", "he", "she", "it", "we", "they",
-        "this", "that", "these", "those", "my", "your", "his", "her", "its", "our", "their"
-    }
-    
-    for word in blob.words:
-        if len(word) > 2 and word not in stop_words:
-            if word in word_freq:
-                word_freq[word] += 1
-            else:
-                word_freq[word] = 1
-    
-    # Sort by frequency and return top N
-    sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-    return [word for word, freq in sorted_words[:top_n]]
\ No newline at end of file
+    # Most frequent first; ties keep their order of first occurrence
+    return [word for word, _ in keyword_counts(text).most_common(top_n)]
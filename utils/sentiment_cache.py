@@ -0,0 +1,180 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from utils.sentiment import analyze_sentiment, SCORER_VERSION
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different copies share a key."""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+class SentimentCache:
+    """
+    Bounded LRU/TTL cache of analyze_sentiment results keyed by normalized text.
+
+    Keys are a hash of the scorer version plus the normalized text, so changing
+    a weight or threshold in utils.sentiment invalidates every cached result.
+    An optional SQLite file acts as a second tier that survives restarts;
+    rows written by another scorer version are purged when it is opened, and
+    expired rows and the oldest rows beyond `max_disk_entries` are pruned as
+    new ones are written. A prune trims the disk tier to PRUNE_TO of its cap,
+    so it runs once per that many writes rather than on every write.
+
+    Args:
+        max_entries: Maximum number of results kept in memory
+        ttl: Seconds a result stays valid (0 disables expiry)
+        disk_path: Path of the on-disk tier, or None to keep it in memory only
+        scorer_version: Version string mixed into every key
+        max_disk_entries: Maximum number of results kept on disk
+    """
+
+    # Share of max_disk_entries left after a prune
+    PRUNE_TO = 0.9
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 24 * 3600,
+                 disk_path: Optional[str] = None, scorer_version: str = SCORER_VERSION,
+                 max_disk_entries: int = 200000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.scorer_version = scorer_version
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # The disk tier has its own lock so slow writes do not hold up memory hits
+        self._disk_lock = threading.Lock()
+        self._disk_rows = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            with self._disk:
+                self._disk.execute("PRAGMA journal_mode=WAL")
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS sentiment_cache ("
+                    "key TEXT PRIMARY KEY, scorer_version TEXT, result TEXT, created REAL)"
+                )
+                self._disk.execute("CREATE INDEX IF NOT EXISTS sentiment_cache_created ON sentiment_cache (created)")
+                self._disk.execute("DELETE FROM sentiment_cache WHERE scorer_version != ?", (scorer_version,))
+                self._prune()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.scorer_version}\0{normalize_text(text)}".encode()).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for `text`, or None on a miss."""
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, result = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(result)
+                del self._entries[key]
+                self.expirations += 1
+
+        if self._disk is not None:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT result, created FROM sentiment_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None and not self._expired(row[1]):
+                result = json.loads(row[0])
+                with self._lock:
+                    self._store(key, row[1], result)
+                    self.disk_hits += 1
+                return dict(result)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key: str, created: float, result: Dict[str, Any]):
+        self._entries[key] = (created, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune(self):
+        # Caller holds the disk lock (or is the constructor) and commits
+        if self.ttl > 0:
+            self._disk.execute("DELETE FROM sentiment_cache WHERE created < ?", (time.time() - self.ttl,))
+        self._disk.execute(
+            "DELETE FROM sentiment_cache WHERE key IN "
+            "(SELECT key FROM sentiment_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (int(self.max_disk_entries * self.PRUNE_TO),)
+        )
+        self._disk_rows = self._disk.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0]
+
+    def put(self, text: str, result: Dict[str, Any]):
+        """Cache `result` as the score for `text`."""
+        self.put_many([(text, result)])
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]):
+        """
+        Cache several (text, result) pairs, writing them to disk in one
+        transaction. Blocks on disk I/O; call it off the event loop.
+        """
+        created = time.time()
+        rows = []
+        with self._lock:
+            for text, result in items:
+                key = self.key(text)
+                self._store(key, created, dict(result))
+                rows.append((key, self.scorer_version, json.dumps(result), created))
+        if self._disk is None or not rows:
+            return
+        with self._disk_lock, self._disk:
+            self._disk.executemany(
+                "INSERT OR REPLACE INTO sentiment_cache (key, scorer_version, result, created) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            # Replacements are counted too, so this over-estimates; pruning recounts
+            self._disk_rows += len(rows)
+            if self._disk_rows > self.max_disk_entries:
+                self._prune()
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """analyze_sentiment with the cache in front of it."""
+        result = self.get(text)
+        if result is None:
+            result = analyze_sentiment(text)
+            self.put(text, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_entries": self._disk_rows if self._disk is not None else 0,
+                "max_disk_entries": self.max_disk_entries,
+                "scorer_version": self.scorer_version
+            }
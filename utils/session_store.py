@@ -0,0 +1,412 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+TRUNCATION_POLICIES = ("window", "summary")
+
+# Fixed per-message overhead added to the content size in the byte accounting
+MESSAGE_OVERHEAD_BYTES = 64
+
+
+def message_bytes(message: Dict[str, Any]) -> int:
+    """Approximate memory held by one conversation message."""
+    return (len(str(message.get("content", "")).encode("utf-8"))
+            + len(str(message.get("role", "")))
+            + MESSAGE_OVERHEAD_BYTES)
+
+
+class SessionConflictError(Exception):
+    """Raised when a session keeps changing underneath an update, so it cannot be applied."""
+
+
+class SessionOutOfSyncError(Exception):
+    """Raised when a client's turn sequence number does not match the server's history."""
+    
+    def __init__(self, session_id: str, client_seq: int, server_seq: int):
+        super().__init__(f"Session {session_id} is at turn {server_seq}, client sent {client_seq}")
+        self.client_seq = client_seq
+        self.server_seq = server_seq
+
+
+class SessionBackend:
+    """
+    Interface shared by the conversation history stores. Counters in
+    `stats` are per process.
+
+    Sessions expire `ttl` seconds after their last use. When there are more
+    than `max_sessions` sessions or they hold more than `max_total_bytes`, the
+    least recently used sessions are evicted. Each history is kept within
+    `max_turns` messages and `max_session_bytes` bytes by dropping the oldest
+    messages ("window") or folding them into a leading summary ("summary").
+
+    Every session also has a sequence number: the total number of messages
+    it has received, which truncation does not reduce. Clients compare it
+    with their own message count to detect when their history has diverged.
+
+    Args:
+        ttl: Seconds of inactivity before a session expires
+        max_sessions: Maximum number of live sessions
+        max_total_bytes: Memory budget for all sessions together
+        max_turns: Maximum number of messages kept per session
+        max_session_bytes: Memory budget for a single session
+        truncation: "window" or "summary"
+        summary_chars: Maximum length of the summary message
+    """
+
+    # Whether calls block on I/O and belong off the event loop (see session_call)
+    blocking_io = False
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 10000,
+                 max_total_bytes: int = 64 * 1024 * 1024, max_turns: int = 40,
+                 max_session_bytes: int = 64 * 1024, truncation: str = "window",
+                 summary_chars: int = 1000):
+        if truncation not in TRUNCATION_POLICIES:
+            raise ValueError(f"Unknown truncation policy: {truncation}")
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_total_bytes = max_total_bytes
+        self.max_turns = max_turns
+        self.max_session_bytes = max_session_bytes
+        self.truncation = truncation
+        self.summary_chars = summary_chars
+        self.evictions = 0
+        self.expirations = 0
+        self.truncated_messages = 0
+
+    def get(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return a copy of the session's history (empty if unknown or expired)."""
+        raise NotImplementedError
+
+    def set(self, session_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replace the session's history with a client's complete history, applying the
+        truncation policy. The sequence number becomes len(messages). Returns the stored history.
+        """
+        raise NotImplementedError
+
+    def append(self, session_id: str, message: Dict[str, Any], expected_seq: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Append one message to the session's history. Returns the stored history.
+
+        Raises:
+            SessionOutOfSyncError: If `expected_seq` is given and the session's
+                sequence number differs at the moment of the append
+        """
+        raise NotImplementedError
+
+    def seq(self, session_id: str) -> int:
+        """Return the session's sequence number (0 if unknown or expired)."""
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and eviction counters for monitoring."""
+        raise NotImplementedError
+
+    def _truncate(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        # Returns the truncated history and the number of messages dropped from it
+        summary = None
+        if messages and messages[0].get("summary"):
+            summary, messages = messages[0], messages[1:]
+
+        dropped = []
+        size = sum(message_bytes(m) for m in messages) + (message_bytes(summary) if summary else 0)
+        # Always keep the latest message, even if it alone exceeds the budget
+        while len(messages) > 1 and (len(messages) + (1 if summary else 0) > self.max_turns
+                                     or size > self.max_session_bytes):
+            oldest = messages.pop(0)
+            size -= message_bytes(oldest)
+            dropped.append(oldest)
+            if self.truncation == "summary" and summary is None:
+                summary = {"role": "user", "content": "", "summary": True}
+
+        if self.truncation == "window" or summary is None:
+            return messages, len(dropped)
+        if dropped:
+            previous = summary["content"][len("Earlier in this conversation: "):] if summary["content"] else ""
+            notes = [previous] if previous else []
+            notes += [f"{m.get('role', 'user')}: {str(m.get('content', ''))[:80]}" for m in dropped]
+            # Keep the most recent notes when the summary grows past its budget
+            text = " | ".join(notes)[-self.summary_chars:]
+            summary = {"role": "user", "content": f"Earlier in this conversation: {text}", "summary": True}
+        return [summary] + messages, len(dropped)
+
+
+class SessionStore(SessionBackend):
+    """
+    In-process session backend: an LRU of histories in this worker's memory.
+    Conversations only survive while every turn reaches the same process.
+    Takes the same limits as SessionBackend.
+    """
+
+    def __init__(self, **limits):
+        super().__init__(**limits)
+        # session_id -> [last_used, size_bytes, messages, seq], least recently used first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+    def _drop(self, session_id: str):
+        _, size, _, _ = self._sessions.pop(session_id)
+        self.total_bytes -= size
+
+    def _expire(self, now: float):
+        # Sessions are ordered by last use, so expired ones are at the front
+        while self._sessions:
+            session_id, (last_used, _, _, _) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            self._drop(session_id)
+            self.expirations += 1
+
+    def get(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return a copy of the session's history (empty if unknown or expired)."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            entry[0] = now
+            self._sessions.move_to_end(session_id)
+            return list(entry[2])
+
+    def _set(self, session_id: str, messages: List[Dict[str, Any]], seq: int, now: float) -> List[Dict[str, Any]]:
+        self._expire(now)
+        messages, dropped = self._truncate(messages)
+        self.truncated_messages += dropped
+        size = sum(message_bytes(m) for m in messages)
+        if session_id in self._sessions:
+            self._drop(session_id)
+        self._sessions[session_id] = [now, size, messages, seq]
+        self.total_bytes += size
+
+        # Evict least recently used sessions, never the one just written
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions
+                                           or self.total_bytes > self.max_total_bytes):
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+        return list(messages)
+
+    def set(self, session_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replace the session's history with a client's complete history, applying the
+        truncation policy. The sequence number becomes len(messages). Returns the stored history.
+        """
+        with self._lock:
+            return self._set(session_id, list(messages), len(messages), time.time())
+
+    def append(self, session_id: str, message: Dict[str, Any], expected_seq: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Append one message to the session's history. Returns the stored history."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            seq = entry[3] if entry is not None else 0
+            if expected_seq is not None and expected_seq != seq:
+                raise SessionOutOfSyncError(session_id, expected_seq, seq)
+            messages = list(entry[2]) if entry is not None else []
+            messages.append(message)
+            return self._set(session_id, messages, seq + 1, now)
+
+    def seq(self, session_id: str) -> int:
+        """Return the session's sequence number (0 if unknown or expired)."""
+        with self._lock:
+            self._expire(time.time())
+            entry = self._sessions.get(session_id)
+            return entry[3] if entry is not None else 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and eviction counters for monitoring."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self.total_bytes,
+                "max_sessions": self.max_sessions,
+                "max_total_bytes": self.max_total_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "truncated_messages": self.truncated_messages,
+                "truncation": self.truncation,
+                "backend": "memory"
+            }
+
+
+class SqliteSessionStore(SessionBackend):
+    """
+    Session backend shared by every process on the host through one SQLite
+    database in WAL mode, so any uvicorn worker can serve any turn.
+
+    Each row carries a version number. An update reads the row, applies the
+    change and writes it back only if the version is unchanged; if another
+    worker got there first, the update is retried on the fresh row (up to
+    `max_retries` times, with jittered backoff) so concurrent turns of one
+    session never overwrite each other. Every call blocks on SQLite, so
+    coroutines make it in a worker thread. Expired sessions are ignored on read
+    and, like the session count and byte limits, enforced on the whole table
+    every `maintenance_interval` writes.
+
+    Args:
+        path: Path of the database file
+        max_retries: Attempts per update before SessionConflictError
+        maintenance_interval: Writes between expiry and eviction sweeps
+        Other limits as for SessionBackend
+    """
+
+    blocking_io = True
+
+    def __init__(self, path: str, max_retries: int = 8, maintenance_interval: int = 100, **limits):
+        super().__init__(**limits)
+        self.path = path
+        self.max_retries = max_retries
+        self.maintenance_interval = maintenance_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.conflicts = 0
+
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, seq INTEGER NOT NULL, "
+                "version INTEGER NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_used ON sessions (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Writers from other processes hold the lock only for one small transaction
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, session_id: str, now: float) -> Optional[tuple]:
+        # Returns (messages, seq, version, live) or None if there is no row
+        row = self._connection().execute(
+            "SELECT messages, seq, version, last_used FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        live = now - row[3] <= self.ttl
+        return (json.loads(row[0]) if live else []), (row[1] if live else 0), row[2], live
+
+    def _update(self, session_id: str, change) -> List[Dict[str, Any]]:
+        # change(messages, seq) -> (messages, seq); applied with a compare-and-swap on the version
+        conn = self._connection()
+        for attempt in range(self.max_retries):
+            now = time.time()
+            current = self._read(session_id, now)
+            messages, seq = change(*(current[:2] if current else ([], 0)))
+            messages, dropped = self._truncate(messages)
+            payload = json.dumps(messages)
+            size = sum(message_bytes(m) for m in messages)
+            with conn:
+                if current is None:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO sessions (session_id, messages, seq, version, size, last_used) "
+                        "VALUES (?, ?, ?, 1, ?, ?)", (session_id, payload, seq, size, now)
+                    )
+                else:
+                    cursor = conn.execute(
+                        "UPDATE sessions SET messages = ?, seq = ?, version = version + 1, size = ?, last_used = ? "
+                        "WHERE session_id = ? AND version = ?", (payload, seq, size, now, session_id, current[2])
+                    )
+            if cursor.rowcount == 1:
+                with self._lock:
+                    self.truncated_messages += dropped
+                    if current is not None and not current[3]:
+                        self.expirations += 1
+                    self._writes += 1
+                    maintain = self._writes % self.maintenance_interval == 0
+                if maintain:
+                    self._maintain(now)
+                return messages
+            with self._lock:
+                self.conflicts += 1
+            time.sleep(random.uniform(0, 0.001 * 2 ** attempt))
+        raise SessionConflictError(f"Session {session_id} changed concurrently {self.max_retries} times")
+
+    def _maintain(self, now: float):
+        conn = self._connection()
+        with conn:
+            expired = conn.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.ttl,)).rowcount
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+            evict = []
+            if count > self.max_sessions or total > self.max_total_bytes:
+                # Walk from the least recently used until both limits hold; keep at least one session
+                for session_id, size in conn.execute(
+                    "SELECT session_id, size FROM sessions ORDER BY last_used LIMIT ?", (max(count - 1, 0),)
+                ):
+                    if count <= self.max_sessions and total <= self.max_total_bytes:
+                        break
+                    evict.append((session_id,))
+                    count -= 1
+                    total -= size
+                conn.executemany("DELETE FROM sessions WHERE session_id = ?", evict)
+        with self._lock:
+            self.expirations += expired
+            self.evictions += len(evict)
+
+    def get(self, session_id: str) -> List[Dict[str, Any]]:
+        now = time.time()
+        current = self._read(session_id, now)
+        if current is None or not current[3]:
+            return []
+        conn = self._connection()
+        with conn:
+            # Refresh the last use without bumping the version; skipped if refreshed within the last second
+            conn.execute("UPDATE sessions SET last_used = ? WHERE session_id = ? AND last_used < ?",
+                         (now, session_id, now - 1))
+        return current[0]
+
+    def set(self, session_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        messages = list(messages)
+        return self._update(session_id, lambda _messages, _seq: (messages, len(messages)))
+
+    def append(self, session_id: str, message: Dict[str, Any], expected_seq: Optional[int] = None) -> List[Dict[str, Any]]:
+        def change(messages, seq):
+            # Checked on every attempt, so a turn that lost the race is rejected rather than retried
+            if expected_seq is not None and expected_seq != seq:
+                raise SessionOutOfSyncError(session_id, expected_seq, seq)
+            return messages + [message], seq + 1
+        return self._update(session_id, change)
+
+    def seq(self, session_id: str) -> int:
+        current = self._read(session_id, time.time())
+        return current[1] if current is not None else 0
+
+    def __contains__(self, session_id: str) -> bool:
+        current = self._read(session_id, time.time())
+        return current is not None and current[3]
+
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions WHERE last_used >= ?", (time.time() - self.ttl,)
+        ).fetchone()
+        with self._lock:
+            return {
+                "sessions": count,
+                "total_bytes": total,
+                "max_sessions": self.max_sessions,
+                "max_total_bytes": self.max_total_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "truncated_messages": self.truncated_messages,
+                "truncation": self.truncation,
+                "conflicts": self.conflicts,
+                "backend": "sqlite"
+            }
@@ -0,0 +1,580 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+
+# Columns stored for every feedback record, in insertion order. scorer_version
+# identifies the sentiment scorer that produced sentiment and score; cluster_id
+# is the id of the first record of the record's near-duplicate cluster.
+FEEDBACK_COLUMNS = ("id", "text", "category", "user_id", "sentiment", "score", "timestamp",
+                    "scorer_version", "cluster_id")
+
+
+def encode_cursor(record: Dict[str, Any]) -> str:
+    """Encode the keyset position just after `record` as an opaque cursor."""
+    raw = json.dumps([record["timestamp"], record["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor produced by `encode_cursor` into (timestamp, id)."""
+    try:
+        timestamp, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), str(record_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """Encode a result offset as an opaque cursor, for orderings without a stable key."""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    """Decode a cursor produced by `encode_offset_cursor`."""
+    try:
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+_SEARCH_TERM = re.compile(r"\w+")
+
+
+class FeedbackRepository:
+    """
+    Interface shared by the feedback storage backends.
+
+    Records are ordered by (timestamp, id). `list` pages through them with
+    keyset pagination: the returned cursor encodes the last record of the
+    page and the next call continues strictly after it.
+    """
+
+    def append(self, record: Dict[str, Any]):
+        """Store a single record."""
+        raise NotImplementedError
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        """Store several records in a single write; either all or none are stored."""
+        raise NotImplementedError
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Return every stored record in insertion order."""
+        raise NotImplementedError
+
+    def rewrite(self, records: List[Dict[str, Any]]):
+        """Atomically replace every stored record with `records`."""
+        raise NotImplementedError
+
+    def update_scores(self, updates: Iterable[Tuple[str, str, float, str]]):
+        """
+        Atomically set the sentiment, score and scorer version of existing
+        records; either every update is applied or none is.
+
+        Args:
+            updates: (id, sentiment, score, scorer_version) tuples; ids that
+                are not stored are ignored
+        """
+        raise NotImplementedError
+
+    def list(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+             category: Optional[str] = None, sentiment: Optional[str] = None,
+             start: Optional[str] = None, end: Optional[str] = None,
+             descending: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of records matching the filters.
+
+        Args:
+            limit: Maximum number of records to return (all when None)
+            cursor: Cursor returned by the previous page
+            category: Only return records with this category
+            sentiment: Only return records with this sentiment label
+            start: Inclusive lower bound on the ISO timestamp
+            end: Exclusive upper bound on the ISO timestamp
+            descending: Return the newest records first
+
+        Returns:
+            Tuple of (records, next cursor or None when there are no more pages)
+        """
+        raise NotImplementedError
+
+    def iter_records(self, batch_size: int = 1000, **filters) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every record matching `filters` (see `list`) oldest first,
+        fetching `batch_size` records at a time so memory stays bounded.
+        """
+        cursor = None
+        while True:
+            page, cursor = self.list(limit=batch_size, cursor=cursor, **filters)
+            yield from page
+            if cursor is None:
+                return
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[str] = None,
+               category: Optional[str] = None, sentiment: Optional[str] = None,
+               start: Optional[str] = None, end: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of records whose text matches `query`, best match first.
+
+        Args:
+            query: Words that must all occur in the text
+            limit: Maximum number of records to return
+            cursor: Cursor returned by the previous page
+            category, sentiment, start, end: Filters as in `list`
+
+        Returns:
+            Tuple of (records with a "relevance" field, next cursor or None)
+
+        Raises:
+            NotImplementedError: If the backend has no full-text index
+        """
+        raise NotImplementedError("Full-text search is not supported by this storage backend")
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class FeedbackLog(FeedbackRepository):
+    """
+    Append-only feedback store backed by NDJSON segment files.
+
+    Every record is written as a single line at the end of the active segment,
+    so a submission costs the same no matter how many records are stored.
+    Segments are rotated once they grow past `max_segment_bytes`. On startup
+    the in-memory state is rebuilt by replaying all segments in order.
+
+    Args:
+        directory: Directory holding the segment files
+        legacy_file: JSON array file to import on first run, if any
+        max_segment_bytes: Size at which the active segment is rotated
+        fsync: Whether to fsync after every append
+    """
+
+    def __init__(self, directory: str, legacy_file: Optional[str] = None,
+                 max_segment_bytes: int = 64 * 1024 * 1024, fsync: bool = True):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = []
+        self._active = None
+        self._active_index = 0
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segment_indexes()
+        if not segments:
+            self._migrate(legacy_file)
+            segments = self._segment_indexes()
+
+        for index in segments:
+            self._replay(self._segment_path(index))
+        self._open_segment(segments[-1])
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{index:06d}{SEGMENT_SUFFIX}")
+
+    def _segment_indexes(self) -> List[int]:
+        indexes = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    indexes.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(indexes)
+
+    def _migrate(self, legacy_file: Optional[str]):
+        # Import the old JSON array once, then the first segment marks the log as initialized
+        records = []
+        if legacy_file and os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, "r") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, list):
+                    records = loaded
+            except json.JSONDecodeError:
+                records = []
+
+        path = self._segment_path(1)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _replay(self, path: str):
+        good_offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                # A torn write from a crash can only be at the tail; drop it. A last
+                # line without its newline is torn even if it parses, or the next
+                # append would be glued onto it
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self._records.append(json.loads(line))
+                except ValueError:
+                    break
+                good_offset += len(line)
+        if good_offset < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+
+    def _open_segment(self, index: int):
+        if self._active:
+            self._active.close()
+        self._active_index = index
+        self._active = open(self._segment_path(index), "a")
+
+    def _write_lines(self, records: List[Dict[str, Any]]):
+        if self._active.tell() >= self.max_segment_bytes:
+            self._open_segment(self._active_index + 1)
+        self._active.write("".join(json.dumps(record) + "\n" for record in records))
+        self._active.flush()
+        if self.fsync:
+            os.fsync(self._active.fileno())
+
+    def append(self, record: Dict[str, Any]):
+        """Append a single record to the log."""
+        with self._lock:
+            self._write_lines([record])
+            self._records.append(record)
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        """Append several records with a single write (and fsync, if enabled)."""
+        with self._lock:
+            self._write_lines(records)
+            self._records.extend(records)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Return a copy of every stored record in insertion order."""
+        with self._lock:
+            return list(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def rewrite(self, records: List[Dict[str, Any]]):
+        """
+        Replace the whole log with `records`, compacting it into one segment.
+        The new segment is written to a temporary file and renamed into place.
+        """
+        with self._lock:
+            old_segments = self._segment_indexes()
+            index = old_segments[-1] + 1 if old_segments else 1
+            path = self._segment_path(index)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self._active.close()
+            self._active = None
+            for old in old_segments:
+                os.remove(self._segment_path(old))
+            self._records = list(records)
+            self._open_segment(index)
+
+    def update_scores(self, updates: Iterable[Tuple[str, str, float, str]]):
+        # The whole log is in memory already; apply the updates and compact it in one rewrite
+        changes = {record_id: (sentiment, score, version) for record_id, sentiment, score, version in updates}
+        with self._lock:
+            records = list(self._records)
+        updated = []
+        for record in records:
+            change = changes.get(record.get("id"))
+            if change is not None:
+                record = {**record, "sentiment": change[0], "score": change[1], "scorer_version": change[2]}
+            updated.append(record)
+        self.rewrite(updated)
+
+    def list(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+             category: Optional[str] = None, sentiment: Optional[str] = None,
+             start: Optional[str] = None, end: Optional[str] = None,
+             descending: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            records = list(self._records)
+
+        matches = []
+        for record in records:
+            key = (record.get("timestamp", ""), record.get("id", ""))
+            if category is not None and record.get("category") != category:
+                continue
+            if sentiment is not None and record.get("sentiment") != sentiment:
+                continue
+            if start is not None and key[0] < start:
+                continue
+            if end is not None and key[0] >= end:
+                continue
+            if after is not None and (key <= after if not descending else key >= after):
+                continue
+            matches.append(record)
+
+        matches.sort(key=lambda r: (r.get("timestamp", ""), r.get("id", "")), reverse=descending)
+        if limit is None or len(matches) <= limit:
+            return matches, None
+        page = matches[:limit]
+        return page, encode_cursor(page[-1])
+
+    def iter_records(self, batch_size: int = 1000, **filters) -> Iterator[Dict[str, Any]]:
+        # The records already live in memory, so filter a single sorted snapshot
+        records, _ = self.list(**filters)
+        yield from records
+
+
+class SqliteFeedbackRepository(FeedbackRepository):
+    """
+    Feedback store backed by a SQLite database in WAL mode.
+
+    Timestamp, category and sentiment are indexed together with the keyset
+    columns so filtered pages only touch the matching rows. Each thread gets
+    its own connection; writes are serialized through a lock.
+
+    The text is also indexed in an FTS5 table (porter stemming) that triggers
+    keep in step with every write, so `search` ranks matches with BM25 without
+    reading the corpus. If the SQLite build lacks FTS5, search is unavailable.
+
+    Args:
+        path: Path of the database file
+        legacy_file: JSON array file to import when the database is created
+        synchronous: SQLite synchronous mode; "FULL" (the default) makes every
+            acknowledged commit durable, "NORMAL" survives process crashes but
+            may lose the last commits on power loss
+    """
+
+    def __init__(self, path: str, legacy_file: Optional[str] = None, synchronous: str = "FULL"):
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Unknown synchronous mode: {synchronous}")
+        self.path = path
+        self.synchronous = synchronous.upper()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        conn = self._connection()
+        created = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'feedback'"
+        ).fetchone() is None
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback ("
+                "id TEXT PRIMARY KEY, text TEXT NOT NULL, category TEXT, user_id TEXT, "
+                "sentiment TEXT, score REAL, timestamp TEXT NOT NULL, scorer_version TEXT, cluster_id TEXT)"
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(feedback)")}
+            for column in ("scorer_version", "cluster_id"):
+                if column not in columns:
+                    # Databases created before records carried this column
+                    conn.execute(f"ALTER TABLE feedback ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_category ON feedback (category, timestamp, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_sentiment ON feedback (sentiment, timestamp, id)")
+        self.full_text = self._create_full_text_index(conn)
+
+        if created and legacy_file and os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, "r") as f:
+                    loaded = json.load(f)
+            except json.JSONDecodeError:
+                loaded = []
+            if isinstance(loaded, list):
+                self._insert(loaded)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            # INSERT OR REPLACE only fires the delete trigger that keeps the FTS index in step with this on
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _create_full_text_index(conn: sqlite3.Connection) -> bool:
+        exists = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'"
+        ).fetchone() is not None
+        if exists:
+            return True
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE feedback_fts USING fts5("
+                    "text, content='feedback', content_rowid='rowid', tokenize='porter unicode61')"
+                )
+                conn.execute(
+                    "CREATE TRIGGER feedback_fts_insert AFTER INSERT ON feedback BEGIN "
+                    "INSERT INTO feedback_fts (rowid, text) VALUES (new.rowid, new.text); END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER feedback_fts_delete AFTER DELETE ON feedback BEGIN "
+                    "INSERT INTO feedback_fts (feedback_fts, rowid, text) VALUES ('delete', old.rowid, old.text); END"
+                )
+                conn.execute(
+                    "CREATE TRIGGER feedback_fts_update AFTER UPDATE OF text ON feedback BEGIN "
+                    "INSERT INTO feedback_fts (feedback_fts, rowid, text) VALUES ('delete', old.rowid, old.text); "
+                    "INSERT INTO feedback_fts (rowid, text) VALUES (new.rowid, new.text); END"
+                )
+                # Index rows stored before the full-text index existed
+                conn.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5
+            return False
+        return True
+
+    @staticmethod
+    def _row_values(record: Dict[str, Any]) -> tuple:
+        return tuple(record.get(column) for column in FEEDBACK_COLUMNS)
+
+    def _insert(self, records: List[Dict[str, Any]]):
+        placeholders = ", ".join("?" for _ in FEEDBACK_COLUMNS)
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO feedback ({', '.join(FEEDBACK_COLUMNS)}) VALUES ({placeholders})",
+                [self._row_values(record) for record in records]
+            )
+
+    def append(self, record: Dict[str, Any]):
+        self._insert([record])
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        self._insert(records)
+
+    def all(self) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            f"SELECT {', '.join(FEEDBACK_COLUMNS)} FROM feedback ORDER BY rowid"
+        )
+        return [dict(row) for row in rows]
+
+    def rewrite(self, records: List[Dict[str, Any]]):
+        placeholders = ", ".join("?" for _ in FEEDBACK_COLUMNS)
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.execute("DELETE FROM feedback")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO feedback ({', '.join(FEEDBACK_COLUMNS)}) VALUES ({placeholders})",
+                [self._row_values(record) for record in records]
+            )
+
+    def update_scores(self, updates: Iterable[Tuple[str, str, float, str]]):
+        # One transaction, so readers see either every old score or every new one
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.executemany(
+                "UPDATE feedback SET sentiment = ?, score = ?, scorer_version = ? WHERE id = ?",
+                ((sentiment, score, version, record_id) for record_id, sentiment, score, version in updates)
+            )
+
+    def list(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+             category: Optional[str] = None, sentiment: Optional[str] = None,
+             start: Optional[str] = None, end: Optional[str] = None,
+             descending: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        clauses, params = [], []
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if sentiment is not None:
+            clauses.append("sentiment = ?")
+            params.append(sentiment)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        if cursor:
+            clauses.append("(timestamp, id) < (?, ?)" if descending else "(timestamp, id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        direction = "DESC" if descending else "ASC"
+        query = f"SELECT {', '.join(FEEDBACK_COLUMNS)} FROM feedback"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY timestamp {direction}, id {direction}"
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = [dict(row) for row in self._connection().execute(query, params)]
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        page = rows[:limit]
+        return page, encode_cursor(page[-1])
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[str] = None,
+               category: Optional[str] = None, sentiment: Optional[str] = None,
+               start: Optional[str] = None, end: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        if not self.full_text:
+            raise NotImplementedError("Full-text search needs SQLite with FTS5")
+        terms = _SEARCH_TERM.findall(query)
+        if not terms:
+            raise ValueError("Query must contain at least one word")
+        offset = decode_offset_cursor(cursor) if cursor else 0
+
+        # Quote every term so user input is never parsed as FTS5 query syntax
+        clauses, params = ["feedback_fts MATCH ?"], [" ".join(f'"{term}"' for term in terms)]
+        for clause, value in (("f.category = ?", category), ("f.sentiment = ?", sentiment),
+                              ("f.timestamp >= ?", start), ("f.timestamp < ?", end)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        columns = ", ".join(f"f.{column}" for column in FEEDBACK_COLUMNS)
+        rows = self._connection().execute(
+            f"SELECT {columns}, bm25(feedback_fts) AS rank FROM feedback_fts "
+            f"JOIN feedback f ON f.rowid = feedback_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} ORDER BY rank, f.rowid LIMIT ? OFFSET ?",
+            params + [limit + 1, offset]
+        ).fetchall()
+
+        records = []
+        for row in rows[:limit]:
+            record = {column: row[column] for column in FEEDBACK_COLUMNS}
+            # bm25() is lower for better matches; report it the other way round
+            record["relevance"] = -row["rank"]
+            records.append(record)
+        next_cursor = encode_offset_cursor(offset + limit) if len(rows) > limit else None
+        return records, next_cursor
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+
+def create_feedback_repository(backend: str, data_dir: str) -> FeedbackRepository:
+    """
+    Open the feedback repository of the given backend ("sqlite" or "log") in
+    `data_dir`, configured from the FEEDBACK_* environment variables. Both
+    backends import feedback.json from `data_dir` on first run.
+    """
+    legacy_file = os.path.join(data_dir, "feedback.json")
+    if backend == "sqlite":
+        return SqliteFeedbackRepository(
+            os.path.join(data_dir, "feedback.db"),
+            legacy_file=legacy_file,
+            synchronous=os.getenv("FEEDBACK_SQLITE_SYNCHRONOUS", "FULL")
+        )
+    if backend == "log":
+        return FeedbackLog(
+            os.path.join(data_dir, "feedback_log"),
+            legacy_file=legacy_file,
+            max_segment_bytes=int(os.getenv("FEEDBACK_SEGMENT_BYTES", 64 * 1024 * 1024)),
+            fsync=os.getenv("FEEDBACK_FSYNC", "true").lower() == "true"
+        )
+    raise ValueError(f"Unknown feedback backend: {backend}")
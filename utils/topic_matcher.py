@@ -0,0 +1,74 @@
+import re
+import string
+from typing import Dict, Iterable, List, Optional
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+# Maps ASCII punctuation (except the apostrophe) to spaces; bytes.translate runs in C
+_PUNCTUATION_TO_SPACE = bytes.maketrans(
+    "".join(c for c in string.punctuation if c != "'").encode(),
+    b" " * (len(string.punctuation) - 1)
+)
+
+
+class TopicMatcher:
+    """
+    Single-pass keyword classifier compiled once from a topic -> keywords map.
+
+    Single-word keywords, plus the plural "s"/"es" forms of the keywords of
+    `plural_topics`, go into one lookup table; a message is tokenized once and intersected with it, so only whole
+    words match ("hi" no longer matches inside "this"). The few multi-word
+    phrases are looked up in the space-joined tokens, which keeps them
+    word-bounded as well. Each distinct keyword found adds its word count to
+    the score of every topic listing it, so a phrase outweighs the single
+    words it contains.
+
+    Args:
+        topics: Mapping of topic name to keywords. Its order is the tie-break
+            priority when several topics reach the best score.
+        plural_topics: Topics whose keywords also match in plural form. Leave
+            out topics with short keywords such as "hi", whose "s" form ("his")
+            is an unrelated word.
+    """
+
+    def __init__(self, topics: Dict[str, List[str]], plural_topics: Iterable[str] = ()):
+        plural_topics = set(plural_topics)
+        self.priority = {topic: index for index, topic in enumerate(topics)}
+        self._words: Dict[str, List[str]] = {}
+        self._phrases: Dict[str, List[str]] = {}
+        for topic, keywords in topics.items():
+            for keyword in keywords:
+                base = " ".join(_WORD.findall(keyword.lower()))
+                table = self._phrases if " " in base else self._words
+                forms = (base, base + "s", base + "es") if topic in plural_topics else (base,)
+                for form in forms:
+                    entry = table.setdefault(form, [])
+                    if topic not in entry:
+                        entry.append(topic)
+
+        self._word_set = frozenset(self._words)
+        # Phrases are only checked when one of their first words occurs in the message
+        self._phrase_heads = frozenset(phrase.split(" ")[0] for phrase in self._phrases)
+        self._padded_phrases = [(f" {phrase} ", phrase.count(" ") + 1, topics) for phrase, topics in self._phrases.items()]
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Return the score of every topic that matched `text`."""
+        tokens = text.lower().encode().translate(_PUNCTUATION_TO_SPACE).decode().split()
+        scores: Dict[str, int] = {}
+        for word in self._word_set.intersection(tokens):
+            for topic in self._words[word]:
+                scores[topic] = scores.get(topic, 0) + 1
+        if not self._phrase_heads.isdisjoint(tokens):
+            padded = " " + " ".join(tokens) + " "
+            for phrase, weight, topics in self._padded_phrases:
+                if phrase in padded:
+                    for topic in topics:
+                        scores[topic] = scores.get(topic, 0) + weight
+        return scores
+
+    def best(self, text: str) -> Optional[str]:
+        """Return the highest-scoring topic for `text`, or None if nothing matched."""
+        scores = self.scores(text)
+        if not scores:
+            return None
+        return min(scores, key=lambda topic: (-scores[topic], self.priority[topic]))
@@ -0,0 +1,210 @@
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from utils.aggregates import UNCATEGORIZED
+from utils.sentiment import keyword_counts
+
+# Key of the categories beyond a bucket's cap. Missing categories are
+# UNCATEGORIZED, so None never collides with a real category; it is only
+# counted when no category filter is given.
+OTHER_CATEGORY = None
+
+_WINDOW = re.compile(r"^(\d+)([smhd])$")
+_WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_window(window: str) -> int:
+    """Parse a window such as "90m", "24h" or "7d" into seconds."""
+    match = _WINDOW.match(window.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError("window must look like '30m', '24h' or '7d'")
+    return int(match.group(1)) * _WINDOW_UNITS[match.group(2)]
+
+
+class SpaceSaving:
+    """
+    Space-saving top-k counter (Metwally et al.) holding at most `capacity` terms.
+
+    When full, a new term replaces the least counted one and inherits its
+    count, which is recorded as the term's maximum overestimate. Any term
+    whose true count exceeds total/capacity is guaranteed to be kept.
+
+    Args:
+        capacity: Maximum number of terms tracked
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, term: str, count: int = 1):
+        if term in self.counts:
+            self.counts[term] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[term] = count
+            self.errors[term] = 0
+        else:
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+            self.counts[term] = floor + count
+            self.errors[term] = floor
+
+
+class TrendingIndex:
+    """
+    Trending feedback keywords per time window, sentiment and category.
+
+    Time is split into `bucket_seconds` buckets kept in a ring of
+    `retention_buckets` slots; a slot is cleared when its time comes round
+    again. Each bucket holds a space-saving sketch per (sentiment, category)
+    pair counting how many feedback texts mention each keyword. The first
+    `max_categories` categories seen in a bucket get their own sketches;
+    later ones share an overflow sketch until the slot is reused. Memory is
+    bounded by retention_buckets x sentiments x (max_categories + 1) x
+    capacity terms, whatever the vocabulary size. Counts are upper bounds;
+    "error" is how much each may be overestimated by.
+
+    Args:
+        bucket_seconds: Width of one time bucket
+        retention_buckets: Number of buckets kept, i.e. the longest queryable window
+        capacity: Terms tracked per sketch
+        max_categories: Distinct categories tracked per bucket before the rest are pooled
+    """
+
+    def __init__(self, bucket_seconds: int = 3600, retention_buckets: int = 48,
+                 capacity: int = 64, max_categories: int = 20):
+        self.bucket_seconds = bucket_seconds
+        self.retention_buckets = retention_buckets
+        self.capacity = capacity
+        self.max_categories = max_categories
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # (record, keywords) added while a rebuild streams storage, or None when none runs
+        self._pending: Optional[List[Tuple[Dict[str, Any], Any]]] = None
+        self._reset()
+
+    @property
+    def retention_seconds(self) -> int:
+        return self.bucket_seconds * self.retention_buckets
+
+    def _reset(self):
+        # Ring slot -> (bucket number, {(sentiment, category): [feedback count, sketch]}, categories seen)
+        self._ring: List[Optional[Tuple[int, Dict[Tuple[str, Optional[str]], list], set]]] = [None] * self.retention_buckets
+        self._latest_bucket = 0
+
+    def _category(self, categories: set, category: Optional[str]) -> Optional[str]:
+        category = category or UNCATEGORIZED
+        if category in categories:
+            return category
+        if len(categories) < self.max_categories:
+            categories.add(category)
+            return category
+        return OTHER_CATEGORY
+
+    def _add(self, record: Dict[str, Any], keywords: Iterable[str]):
+        try:
+            bucket = int(datetime.fromisoformat(record["timestamp"]).timestamp()) // self.bucket_seconds
+        except (KeyError, TypeError, ValueError):
+            return
+        self._latest_bucket = max(self._latest_bucket, bucket)
+        if bucket <= self._latest_bucket - self.retention_buckets:
+            return
+
+        slot = bucket % self.retention_buckets
+        entry = self._ring[slot]
+        if entry is None or entry[0] != bucket:
+            if entry is not None and entry[0] > bucket:
+                # The slot already holds a newer bucket
+                return
+            entry = self._ring[slot] = (bucket, {}, set())
+
+        key = ((record.get("sentiment") or "neutral").lower(), self._category(entry[2], record.get("category")))
+        counter = entry[1].get(key)
+        if counter is None:
+            counter = entry[1][key] = [0, SpaceSaving(self.capacity)]
+        counter[0] += 1
+        for keyword in keywords:
+            counter[1].add(keyword)
+
+    def add(self, record: Dict[str, Any]):
+        """Count the keywords of a newly stored feedback record."""
+        keywords = keyword_counts(record.get("text") or "")
+        with self._lock:
+            self._add(record, keywords)
+            if self._pending is not None:
+                self._pending.append((record, keywords))
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]):
+        """
+        Recompute the index from scratch by streaming `records` (oldest first).
+        The new index is built aside and swapped in, as in
+        SentimentAggregates.rebuild; records added meanwhile count once.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            fresh = TrendingIndex(self.bucket_seconds, self.retention_buckets, self.capacity, self.max_categories)
+            seen = set()
+            try:
+                for record in records:
+                    fresh._add(record, keyword_counts(record.get("text") or ""))
+                    seen.add(record.get("id"))
+                with self._lock:
+                    for record, keywords in self._pending:
+                        if record.get("id") not in seen:
+                            fresh._add(record, keywords)
+                    self._ring, self._latest_bucket = fresh._ring, fresh._latest_bucket
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def top(self, window: int, sentiment: Optional[str] = None, category: Optional[str] = None,
+            limit: int = 10, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Return the most mentioned keywords over the last `window` seconds.
+
+        Args:
+            window: Window length in seconds, at most retention_seconds
+            sentiment: Only count feedback with this sentiment
+            category: Only count feedback in this category
+            limit: Number of terms returned
+            now: End of the window as a Unix timestamp (defaults to the current time)
+
+        Returns:
+            {"feedback_count", "terms": [{"term", "count", "error"}]}, most mentioned first
+        """
+        if window > self.retention_seconds:
+            raise ValueError(f"window must not exceed {self.retention_seconds // 3600}h")
+        now = time.time() if now is None else now
+        # Buckets are the resolution: the one holding the window's start is included
+        first = (int(now) - window) // self.bucket_seconds
+        last = int(now) // self.bucket_seconds
+
+        counts: Dict[str, int] = {}
+        errors: Dict[str, int] = {}
+        feedback_count = 0
+        with self._lock:
+            for entry in self._ring:
+                if entry is None or not first <= entry[0] <= last:
+                    continue
+                for (key_sentiment, key_category), (matched, sketch) in entry[1].items():
+                    if sentiment is not None and key_sentiment != sentiment:
+                        continue
+                    # The overflow sketch never matches a category filter
+                    if category is not None and key_category != category:
+                        continue
+                    feedback_count += matched
+                    for term, count in sketch.counts.items():
+                        counts[term] = counts.get(term, 0) + count
+                        errors[term] = errors.get(term, 0) + sketch.errors[term]
+
+        terms = sorted(counts, key=lambda term: (-counts[term], errors[term], term))[:limit]
+        return {
+            "feedback_count": feedback_count,
+            "terms": [{"term": term, "count": counts[term], "error": errors[term]} for term in terms]
+        }
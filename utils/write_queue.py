@@ -0,0 +1,156 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, Any, List, Optional, Callable
+
+from utils.metrics import span
+from utils.storage import FeedbackRepository
+
+
+def _resolve(future: Future, error: Optional[BaseException] = None):
+    # A caller that stopped waiting (e.g. the client disconnected) has cancelled
+    # its future; its records are still written, there is just nobody to tell
+    if future.done():
+        return
+    try:
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+    except InvalidStateError:
+        # Cancelled between the check and the call
+        pass
+
+
+class GroupCommitWriter:
+    """
+    Single-writer queue that persists feedback records in group commits.
+
+    Callers enqueue records and wait on a future. One background thread
+    collects whatever is queued for up to `max_delay` seconds (or until
+    `max_batch` records have arrived) and stores the whole group with a
+    single `append_many`, i.e. one transaction and at most one fsync. The
+    futures are resolved only after that write has returned, so a request is
+    acknowledged only once its record is stored; if the write fails, every
+    caller in the group gets the exception. `on_flush` runs after each
+    successful write, before the callers are released; its errors are only
+    logged, since the records are already stored.
+
+    Args:
+        repository: Feedback store written to
+        on_flush: Called with each stored group, e.g. to update aggregates
+        max_batch: Maximum number of records per group commit
+        max_delay: Seconds to wait for more records after the first one arrives
+    """
+
+    def __init__(self, repository: FeedbackRepository,
+                 on_flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 max_batch: int = 512, max_delay: float = 0.005):
+        self.repository = repository
+        self.on_flush = on_flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.flushes = 0
+        self.records_written = 0
+
+    def start(self):
+        """Start the writer thread (also done on the first write)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self):
+        """Write everything already queued, then stop the writer thread."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, records: List[Dict[str, Any]]) -> Future:
+        """Queue `records` for the next group commit; the future resolves once they are stored."""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        future: Future = Future()
+        self._queue.put((list(records), future))
+        return future
+
+    async def write(self, record: Dict[str, Any]):
+        """Store one record, returning once its group commit is durable."""
+        await asyncio.wrap_future(self.submit([record]))
+
+    async def write_many(self, records: List[Dict[str, Any]]):
+        """Store several records in the same group commit."""
+        await asyncio.wrap_future(self.submit(records))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                if self._collect(item):
+                    return
+            except Exception as e:
+                # Never let the writer thread die; later writes would wait forever
+                print(f"Error in feedback writer: {str(e)}")
+
+    def _collect(self, item: tuple) -> bool:
+        # Gathers a group behind `item` and stores it; returns True when asked to stop
+        group = [item]
+        stopping = False
+        try:
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_delay
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+                size += len(item[0])
+            self._flush(group)
+        except Exception as e:
+            for _, future in group:
+                _resolve(future, e)
+            raise
+        return stopping
+
+    def _flush(self, group: List[tuple]):
+        records = [record for records, _ in group for record in records]
+        try:
+            with span("storage.append_many"):
+                self.repository.append_many(records)
+        except Exception as e:
+            for _, future in group:
+                _resolve(future, e)
+            return
+        if self.on_flush is not None:
+            try:
+                self.on_flush(records)
+            except Exception as e:
+                # The records are stored; a failing observer must not fail the writes
+                print(f"Error after storing feedback: {str(e)}")
+        self.flushes += 1
+        self.records_written += len(records)
+        for _, future in group:
+            _resolve(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring."""
+        return {
+            "queued": self._queue.qsize(),
+            "flushes": self.flushes,
+            "records_written": self.records_written,
+            "mean_group_size": self.records_written / self.flushes if self.flushes else 0.0
+        }